@@ -0,0 +1,63 @@
+"""Redis calls saved by the Bloom filter in front of the token blocklist.
+
+Replays token checks against a filter filled with revoked JTIs and counts
+how many of them would still need a Redis GET.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from extensions.blocklist import BloomFilter  # noqa: E402
+
+
+def run(requests, revoked, revoked_share, capacity, error_rate):
+    bloom = BloomFilter(capacity, error_rate)
+    revoked_jtis = [str(uuid.uuid4()) for _ in range(revoked)]
+    for jti in revoked_jtis:
+        bloom.add(jti)
+
+    redis_calls = 0
+    false_positives = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        if revoked_jtis and random.random() < revoked_share:
+            jti = random.choice(revoked_jtis)
+            is_revoked = True
+        else:
+            jti = str(uuid.uuid4())
+            is_revoked = False
+        if jti in bloom:
+            redis_calls += 1
+            false_positives += not is_revoked
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'revoked_tokens': revoked,
+        'revoked_share': revoked_share,
+        'filter_memory_bytes': bloom.memory,
+        'filter_hashes': bloom.hashes,
+        'redis_calls_without_filter': requests,
+        'redis_calls_with_filter': redis_calls,
+        'redis_calls_saved': requests - redis_calls,
+        'false_positives': false_positives,
+        'lookup_us': elapsed / requests * 1e6
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=10_000)
+    parser.add_argument('--revoked', type=int, default=100_000)
+    parser.add_argument('--revoked-share', type=float, default=0.001)
+    parser.add_argument('--capacity', type=int, default=1_000_000)
+    parser.add_argument('--error-rate', type=float, default=0.001)
+    args = parser.parse_args()
+    result = run(args.requests, args.revoked, args.revoked_share, args.capacity, args.error_rate)
+    print(json.dumps(result, indent=2))
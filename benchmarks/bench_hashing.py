@@ -0,0 +1,82 @@
+"""Latency of cheap requests while bcrypt logins are in flight.
+
+Runs under gevent like the gunicorn worker: login greenlets verify bcrypt
+passwords through HashingExecutor while check-auth greenlets wait on a
+few-millisecond I/O call. The check-auth latency is how late the hub wakes
+them up, which is what the executor mode changes.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import statistics  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+
+import bcrypt  # noqa: E402
+import gevent  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from extensions.hashing import HashingExecutor  # noqa: E402
+
+INTERVAL = 0.005
+
+
+def check_auth(latencies, stop_at):
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        # Stands in for the Redis round trip of a check-auth request
+        gevent.sleep(INTERVAL)
+        latencies.append(time.perf_counter() - started)
+
+
+def login(executor, password, pw_hash, stop_at, counter):
+    while time.perf_counter() < stop_at:
+        executor.run(bcrypt.checkpw, password, pw_hash)
+        counter.append(1)
+        # Stands in for the database round trips of a login request
+        gevent.sleep(0)
+
+
+def run(mode, size, rounds, logins, checks, duration):
+    executor = HashingExecutor()
+    executor.mode = mode
+    executor.size = size
+    password = b'password123'
+    pw_hash = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+    # Warm the pool up outside of the measurement
+    executor.run(bcrypt.checkpw, password, pw_hash)
+
+    latencies, logged_in = [], []
+    stop_at = time.perf_counter() + duration
+    greenlets = [gevent.spawn(login, executor, password, pw_hash, stop_at, logged_in) for _ in range(logins)]
+    greenlets += [gevent.spawn(check_auth, latencies, stop_at) for _ in range(checks)]
+    gevent.joinall(greenlets)
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'logins_per_second': len(logged_in) / duration,
+        'check_auth_requests': len(latencies),
+        'check_auth_p50_ms': statistics.median(latencies) * 1000,
+        'check_auth_p99_ms': latencies[int(len(latencies) * 0.99)] * 1000
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', nargs='+', default=list(HashingExecutor.MODES))
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--logins', type=int, default=4)
+    parser.add_argument('--checks', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+    results = [
+        run(mode, args.pool_size, args.rounds, args.logins, args.checks, args.duration)
+        for mode in args.modes
+    ]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,84 @@
+"""Per-request cost of the Prometheus request metrics.
+
+Times the before/after request hooks of extensions.metrics directly inside
+a request context, and end to end as the latency difference of a trivial
+route served with and without them. With --multiprocess the samples go to
+mmap files like under gunicorn.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+def create_bench_app(with_metrics):
+    from extensions.metrics import init_metrics
+    from flask import Flask
+
+    app = Flask(__name__)
+
+    @app.route('/v1/check-auth')
+    def check_auth():
+        return {'email': 'user@example.com', 'roles': []}
+
+    if with_metrics:
+        init_metrics(app)
+    return app
+
+
+def time_hooks(app, requests):
+    from extensions.metrics import _observe_request, _start_timer
+
+    with app.test_request_context('/v1/check-auth'):
+        response = app.response_class('{}')
+        started = time.perf_counter()
+        for _ in range(requests):
+            _start_timer()
+            _observe_request(response)
+        return (time.perf_counter() - started) / requests * 1e6
+
+
+def time_requests(app, requests):
+    client = app.test_client()
+    for _ in range(200):
+        client.get('/v1/check-auth')
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get('/v1/check-auth')
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--multiprocess', action='store_true')
+    args = parser.parse_args()
+
+    # prometheus_client picks its value storage on import
+    if args.multiprocess:
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='prometheus-bench-')
+
+    plain = create_bench_app(with_metrics=False)
+    instrumented = create_bench_app(with_metrics=True)
+    plain_us = time_requests(plain, args.requests)
+    instrumented_us = time_requests(instrumented, args.requests)
+
+    print(json.dumps({
+        'requests': args.requests,
+        'multiprocess': args.multiprocess,
+        'hooks_us': time_hooks(instrumented, args.requests),
+        'request_median_us': plain_us,
+        'instrumented_request_median_us': instrumented_us,
+        'overhead_us': instrumented_us - plain_us
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
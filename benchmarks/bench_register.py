@@ -0,0 +1,80 @@
+"""Registration throughput with a share of duplicate emails.
+
+Drives /v1/register at a fixed concurrency where `--duplicates` of the
+requests reuse an already registered email, with the Redis pre-check of
+registered emails off and on. Needs the Postgres and Redis the app is
+configured for, like load.py. In-process the rate limiter is switched off;
+with --url the pre-check setting of the running service applies and only
+one run is made.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from app import create_app  # noqa: E402
+from extensions.limiter import limiter  # noqa: E402
+from load import PASSWORD, AppClient, HttpClient, drive, headers, seed  # noqa: E402
+
+
+def register_scenario(emails, duplicates, run_id):
+    registered = itertools.count()
+
+    def register(client, tokens, n):
+        if random.random() < duplicates:
+            email = emails[n % len(emails)]
+        else:
+            email = f'bench-{run_id}-register-{next(registered)}@example.com'
+        data = {'email': email, 'password': PASSWORD, 'confirm_password': PASSWORD}
+        return client.request('POST', '/v1/register', headers(), json=data)[0]
+
+    return register
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Base URL of a running service, in-process when omitted')
+    parser.add_argument('--users', type=int, default=1000, help='Registered users the duplicates come from')
+    parser.add_argument('--duplicates', type=float, nargs='+', default=[0, 0.5, 0.9])
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per run')
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    app = create_app()
+    emails, _, _ = seed(args.users, 0, run_id)
+
+    if args.url:
+        clients = [HttpClient(args.url) for _ in range(args.concurrency)]
+        prechecks = [None]
+    else:
+        limiter.enabled = False
+        clients = [AppClient(app) for _ in range(args.concurrency)]
+        prechecks = [False, True]
+    tokens = [{} for _ in clients]
+
+    results = []
+    for precheck in prechecks:
+        if precheck is not None:
+            app.config['REGISTRATION_PRECHECK'] = precheck
+        for duplicates in args.duplicates:
+            scenario = register_scenario(emails, duplicates, f'{run_id}-{precheck}-{duplicates}')
+            result = drive(scenario, clients, tokens, args.duration)
+            results.append({'precheck': precheck, 'duplicates': duplicates, **result})
+
+    print(json.dumps({
+        'mode': 'http' if args.url else 'in-process',
+        'users': args.users,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'runs': results
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
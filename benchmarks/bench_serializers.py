@@ -0,0 +1,87 @@
+"""Many-row dumps: marshmallow + jsonify against compiled serializers + orjson.
+
+Builds login history and role rows in memory and times the whole response
+body for each, checking that both paths produce the same bytes.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+import uuid
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+LoginRecord = namedtuple('LoginRecord', ['user_id', 'user_agent', 'auth_datetime'])
+RoleRecord = namedtuple('RoleRecord', ['name', 'description'])
+
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0 Safari/537.36'
+
+
+def make_rows(rows):
+    user_id = uuid.uuid4()
+    started = datetime.datetime(2022, 1, 1, 12, 0, 0, 123456)
+    login_history = [
+        LoginRecord(user_id, USER_AGENT, started + datetime.timedelta(minutes=i))
+        for i in range(rows)
+    ]
+    roles = [RoleRecord(f'role_{i}', f'Role number {i}') for i in range(rows)]
+    return login_history, roles
+
+
+def time_dump(dump, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        body = dump()
+    return (time.perf_counter() - started) / rounds * 1e6, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    from extensions.json_provider import json_provider, json_response
+    from flask import Flask, jsonify
+    from schemas import login_history_schema, role_schema
+    from serializers import dump_login_history, dump_roles
+
+    app = Flask(__name__)
+    app.config['JSON_PROVIDER'] = 'orjson'
+    json_provider.init_app(app)
+
+    cases = {
+        'login_history': (login_history_schema, dump_login_history),
+        'roles': (role_schema, dump_roles)
+    }
+    results = []
+    with app.test_request_context():
+        for rows in args.rows:
+            login_history, roles = make_rows(rows)
+            data = {'login_history': login_history, 'roles': roles}
+            for name, (schema, dump) in cases.items():
+                records = data[name]
+                marshmallow_us, expected = time_dump(
+                    lambda: jsonify(schema.dump(records, many=True)).get_data(), args.rounds
+                )
+                compiled_us, body = time_dump(
+                    lambda: json_response(dump(records)).get_data(), args.rounds
+                )
+                if body != expected:
+                    raise SystemExit(f'{name}: compiled output differs from marshmallow')
+                results.append({
+                    'schema': name,
+                    'rows': rows,
+                    'marshmallow_us': marshmallow_us,
+                    'compiled_us': compiled_us,
+                    'speedup': marshmallow_us / compiled_us
+                })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
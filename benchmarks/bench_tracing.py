@@ -0,0 +1,113 @@
+"""Per-request cost of tracing at different sample rates.
+
+Serves a trivial Flask route through the test client, untraced and then
+instrumented like the service with each sampling setup. The exporter either
+discards spans (SDK cost only) or is the console one writing to /dev/null
+(serialization cost too).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from flask import Flask
+from opentelemetry.instrumentation.flask import FlaskInstrumentor
+from opentelemetry.sdk.trace.export import ConsoleSpanExporter, SpanExporter, SpanExportResult
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from extensions.jaeger import create_tracer_provider  # noqa: E402
+
+CONFIG = {
+    'TRACING_ROUTE_SAMPLE_RATIOS': {},
+    'TRACING_SLOW_REQUEST_MS': 500,
+    'TRACING_MAX_QUEUE_SIZE': 2048,
+    'TRACING_SCHEDULE_DELAY_MS': 5000,
+    'TRACING_MAX_EXPORT_BATCH_SIZE': 512,
+    'TRACING_EXPORT_TIMEOUT_MS': 30000
+}
+
+
+class DiscardingExporter(SpanExporter):
+    def __init__(self):
+        self.exported = 0
+
+    def export(self, spans):
+        self.exported += len(spans)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def create_bench_app(provider=None):
+    app = Flask(__name__)
+
+    @app.route('/v1/check-auth')
+    def check_auth():
+        return {'email': 'user@example.com', 'roles': []}
+
+    if provider is not None:
+        FlaskInstrumentor().instrument_app(app, tracer_provider=provider)
+    return app
+
+
+def measure(app, requests):
+    client = app.test_client()
+    for _ in range(200):
+        client.get('/v1/check-auth')
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get('/v1/check-auth')
+        latencies.append(time.perf_counter() - started)
+    return statistics.mean(latencies) * 1e6, statistics.quantiles(latencies, n=100)[98] * 1e6
+
+
+def run(requests, ratios, exporter_name):
+    baseline_mean, baseline_p99 = measure(create_bench_app(), requests)
+    results = [{
+        'setup': 'untraced',
+        'mean_us': baseline_mean,
+        'p99_us': baseline_p99,
+        'overhead_us': 0.0
+    }]
+    for ratio in ratios:
+        for tail_capture in (False, True):
+            if exporter_name == 'console':
+                exporter = ConsoleSpanExporter(out=open(os.devnull, 'w'))
+            else:
+                exporter = DiscardingExporter()
+            provider = create_tracer_provider(
+                {**CONFIG, 'TRACING_SAMPLE_RATIO': ratio, 'TRACING_TAIL_CAPTURE': tail_capture},
+                [exporter]
+            )
+            mean, p99 = measure(create_bench_app(provider), requests)
+            provider.shutdown()
+            results.append({
+                'setup': f'ratio={ratio} tail_capture={tail_capture}',
+                'mean_us': mean,
+                'p99_us': p99,
+                'overhead_us': mean - baseline_mean
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--ratios', type=float, nargs='*', default=[0.0, 0.001, 0.1, 1.0])
+    parser.add_argument('--exporter', choices=['discard', 'console'], default='console')
+    args = parser.parse_args()
+
+    print(json.dumps({
+        'requests': args.requests,
+        'exporter': args.exporter,
+        'results': run(args.requests, args.ratios, args.exporter)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
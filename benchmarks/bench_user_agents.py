@@ -0,0 +1,80 @@
+"""Device type classification: cold ua-parser run against the cached path.
+
+Replays a login stream drawn from a small weighted corpus of real-world
+user agents, the way production traffic concentrates on a few thousand
+distinct strings.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from ua_parser import user_agent_parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.utils import _parse_device_type, get_device_type, get_device_type_cache_stats  # noqa: E402
+
+# (weight, user agent)
+CORPUS = [
+    (30, 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+         'Chrome/118.0.0.0 Safari/537.36'),
+    (8, 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/119.0'),
+    (6, 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/118.0.0.0 Safari/537.36 Edg/118.0.2088.76'),
+    (5, 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/116.0.5845.967 YaBrowser/23.9.1.967 Yowser/2.5 Safari/537.36'),
+    (6, 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+        'Version/17.0 Safari/605.1.15'),
+    (4, 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/118.0.0.0 Safari/537.36'),
+    (3, 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/118.0.0.0 Safari/537.36'),
+    (15, 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 '
+         '(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1'),
+    (12, 'Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) '
+         'Chrome/118.0.0.0 Mobile Safari/537.36'),
+    (3, 'Mozilla/5.0 (iPad; CPU OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+        'Version/17.0 Mobile/15E148 Safari/604.1'),
+    (2, 'Mozilla/5.0 (Linux; Android 13; SM-X700) AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/118.0.0.0 Safari/537.36'),
+    (3, 'okhttp/4.11.0'),
+    (2, 'python-requests/2.31.0'),
+    (1, 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'),
+]
+
+
+def classify_cold(user_agent):
+    # ua-parser keeps a small dict of its own, drop it to measure a real parse
+    user_agent_parser._PARSE_CACHE.clear()
+    return _parse_device_type.__wrapped__(user_agent)
+
+
+def timed(fn, stream):
+    started = time.perf_counter()
+    results = [fn(user_agent) for user_agent in stream]
+    return results, (time.perf_counter() - started) / len(stream) * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=20_000)
+    args = parser.parse_args()
+
+    weights, user_agents = zip(*CORPUS)
+    stream = random.choices(user_agents, weights=weights, k=args.logins)
+
+    cold, cold_us = timed(classify_cold, stream)
+    cached, cached_us = timed(get_device_type, stream)
+    assert cold == cached, 'cached classification differs from ua-parser'
+
+    print(json.dumps({
+        'logins': args.logins,
+        'distinct_user_agents': len(CORPUS),
+        'cold_parse_us': cold_us,
+        'cached_us': cached_us,
+        'speedup': cold_us / cached_us,
+        'cache': get_device_type_cache_stats()
+    }, indent=2))
@@ -0,0 +1,275 @@
+"""Load test of the /v1 endpoints at a fixed concurrency.
+
+Seeds users, a role and login history straight into the database the app is
+configured for (POSTGRES_* / REDIS_* env like the service itself), issues
+tokens with the service's JWT secret, then drives every endpoint in turn
+with `--concurrency` workers for `--duration` seconds and prints rps and
+latency percentiles per endpoint as JSON.
+
+Two modes:
+  --url http://127.0.0.1:8000  requests to a running service
+  (no --url)                   requests to create_app() in this process,
+                               with the rate limiter switched off
+
+Against a running service the rate limits stay in force and show up as 429
+in `statuses`, start it with limits raised for a meaningful run.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from app import create_app  # noqa: E402
+from extensions.db import db  # noqa: E402
+from extensions.hashing import password_hasher  # noqa: E402
+from extensions.limiter import limiter  # noqa: E402
+from models import LOGIN_HISTORY_DEVICE_TYPES, LoginHistory, Role, User  # noqa: E402
+from services.auth_service import auth_service  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+PASSWORD = 'bench123456'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/103.0 Safari/537.36'
+SEED_BATCH = 5000
+
+
+class AppClient:
+    """ Requests to the app in this process through the Flask test client """
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers, json=None, data=None, content_type=None):
+        response = self.client.open(
+            path, method=method, headers=headers, json=json, data=data, content_type=content_type
+        )
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """ Requests to a running service over one keep-alive session per worker """
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, headers, json=None, data=None, content_type=None):
+        if content_type:
+            headers = {**headers, 'Content-Type': content_type}
+        response = self.session.request(method, self.url + path, headers=headers, json=json, data=data)
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+
+def seed(users, history_per_user, run_id):
+    """ Users sharing one password hash, a role to assign, an admin and login history """
+    pw_hash = password_hasher.hash(PASSWORD)
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    emails = [f'bench-{run_id}-{i}@example.com' for i in range(users)]
+    for start in range(0, users, SEED_BATCH):
+        db.session.execute(insert(User), [
+            {'id': user_id, 'email': email, 'password': pw_hash, 'active': True}
+            for user_id, email in zip(user_ids[start:start + SEED_BATCH], emails[start:start + SEED_BATCH])
+        ])
+        db.session.commit()
+
+    now = datetime.datetime.now()
+    rows = (
+        {
+            'id': uuid.uuid4(),
+            'user_id': user_id,
+            'user_agent': USER_AGENT,
+            'auth_datetime': now - datetime.timedelta(minutes=random.randint(0, 60 * 24 * 60)),
+            'user_device_type': random.choice(LOGIN_HISTORY_DEVICE_TYPES)
+        }
+        for user_id in user_ids
+        for _ in range(history_per_user)
+    )
+    while True:
+        batch = list(itertools.islice(rows, SEED_BATCH))
+        if not batch:
+            break
+        db.session.execute(insert(LoginHistory), batch)
+        db.session.commit()
+
+    role_name = f'bench-{run_id}'
+    db.session.add(Role(name=role_name))
+    admin_role = Role.query.filter(Role.name == 'admin').first() or Role(name='admin')
+    admin = User.query.filter(User.email == emails[0]).first()
+    admin.roles.append(admin_role)
+    db.session.commit()
+    return emails, [str(user_id) for user_id in user_ids], role_name
+
+
+def issue_tokens(email):
+    # Same claims as a login, without bcrypt and rate limits in the setup
+    return auth_service.create_tokens(email).get_json()
+
+
+def headers(token=None):
+    result = {'X-Request-Id': str(uuid.uuid4()), 'User-Agent': USER_AGENT}
+    if token:
+        result['Authorization'] = f'Bearer {token}'
+    return result
+
+
+def scenarios(emails, user_ids, role_name, run_id):
+    """ name -> request(client, tokens, n) returning the status code """
+    registered = itertools.count()
+
+    def register(client, tokens, n):
+        email = f'bench-{run_id}-new-{next(registered)}@example.com'
+        data = {'email': email, 'password': PASSWORD, 'confirm_password': PASSWORD}
+        return client.request('POST', '/v1/register', headers(), json=data)[0]
+
+    def login_(client, tokens, n):
+        data = {'email': emails[n % len(emails)], 'password': PASSWORD}
+        return client.request('POST', '/v1/login', headers(), json=data)[0]
+
+    def refresh(client, tokens, n):
+        return client.request('POST', '/v1/refresh', headers(tokens['refresh_token']))[0]
+
+    def check_auth(client, tokens, n):
+        return client.request('GET', '/v1/check-auth', headers(tokens['access_token']))[0]
+
+    def login_history(client, tokens, n):
+        return client.request('GET', '/v1/login-history', headers(tokens['access_token']))[0]
+
+    def roles(client, tokens, n):
+        return client.request('GET', '/v1/roles', headers(tokens['admin_token']))[0]
+
+    def user_role(client, tokens, n):
+        method = 'POST' if n % 2 == 0 else 'DELETE'
+        path = f'/v1/user/{user_ids[n // 2 % len(user_ids)]}/{role_name}'
+        return client.request(method, path, headers(tokens['admin_token']))[0]
+
+    def bulk_role(client, tokens, n):
+        method = 'POST' if n % 2 == 0 else 'DELETE'
+        start = n // 2 * 100 % len(user_ids)
+        data = '\n'.join(f'"{user_id}"' for user_id in user_ids[start:start + 100])
+        path = f'/v1/roles/{role_name}/users'
+        return client.request(
+            method, path, headers(tokens['admin_token']), data=data, content_type='application/x-ndjson'
+        )[0]
+
+    return {
+        'register': register,
+        'login': login_,
+        'refresh': refresh,
+        'check-auth': check_auth,
+        'login-history': login_history,
+        'roles': roles,
+        'user-role': user_role,
+        'roles-bulk': bulk_role
+    }
+
+
+def drive(scenario, clients, tokens, duration):
+    """ Run the scenario in one thread per client until the time is up """
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = itertools.count()
+    stop_at = time.perf_counter() + duration
+
+    def worker(client, worker_tokens):
+        while time.perf_counter() < stop_at:
+            n = next(counter)
+            started = time.perf_counter()
+            try:
+                status = scenario(client, worker_tokens, n)
+            except Exception as exc:
+                status = type(exc).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    threads = [
+        threading.Thread(target=worker, args=(client, worker_tokens))
+        for client, worker_tokens in zip(clients, tokens)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+def summarize(latencies, statuses, elapsed):
+    result = {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'statuses': statuses
+    }
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100)
+        result.update(
+            p50_ms=percentiles[49] * 1000,
+            p95_ms=percentiles[94] * 1000,
+            p99_ms=percentiles[98] * 1000
+        )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Base URL of a running service, in-process when omitted')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--history', type=int, default=20, help='Login history rows per user')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per endpoint')
+    parser.add_argument('--endpoints', nargs='*', help='Subset of endpoints to drive')
+    parser.add_argument('--random-seed', type=int, default=0, help='Seed of the generated data')
+    args = parser.parse_args()
+
+    random.seed(args.random_seed)
+    run_id = uuid.uuid4().hex[:8]
+    app = create_app()
+    emails, user_ids, role_name = seed(args.users, args.history, run_id)
+
+    if args.url:
+        clients = [HttpClient(args.url) for _ in range(args.concurrency)]
+    else:
+        limiter.enabled = False
+        clients = [AppClient(app) for _ in range(args.concurrency)]
+
+    admin_token = issue_tokens(emails[0])['access_token']
+    tokens = []
+    for i in range(args.concurrency):
+        worker_tokens = issue_tokens(emails[i % len(emails)])
+        worker_tokens['admin_token'] = admin_token
+        tokens.append(worker_tokens)
+
+    all_scenarios = scenarios(emails, user_ids, role_name, run_id)
+    selected = args.endpoints or list(all_scenarios)
+    results = {
+        name: drive(all_scenarios[name], clients, tokens, args.duration)
+        for name in selected
+    }
+    print(json.dumps({
+        'mode': 'http' if args.url else 'in-process',
+        'users': args.users,
+        'history_per_user': args.history,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'endpoints': results
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
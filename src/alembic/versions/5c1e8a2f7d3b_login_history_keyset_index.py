@@ -0,0 +1,29 @@
+"""login history keyset index
+
+Revision ID: 5c1e8a2f7d3b
+Revises: 211714ce4f31
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e8a2f7d3b'
+down_revision = '211714ce4f31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_login_history_user_id_auth_datetime',
+        'login_history',
+        ['user_id', sa.text('auth_datetime DESC'), sa.text('id DESC')],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_login_history_user_id_auth_datetime', table_name='login_history')
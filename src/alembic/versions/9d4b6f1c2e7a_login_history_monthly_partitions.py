@@ -0,0 +1,99 @@
+"""login history monthly partitions
+
+Revision ID: 9d4b6f1c2e7a
+Revises: 5c1e8a2f7d3b
+Create Date: 2026-10-18 11:40:03.527816
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from models import LOGIN_HISTORY_PARTITIONS_AHEAD, add_months, create_month_partitions, create_partition
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4b6f1c2e7a'
+down_revision = '5c1e8a2f7d3b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    old_columns = {column['name'] for column in sa.inspect(connection).get_columns('login_history')}
+
+    op.drop_index('ix_login_history_user_id_auth_datetime', table_name='login_history')
+    op.drop_index(op.f('ix_login_history_user_id'), table_name='login_history')
+    op.rename_table('login_history', 'login_history_old')
+
+    op.execute(
+        """CREATE TABLE login_history (
+            id UUID NOT NULL,
+            user_id UUID REFERENCES "user" (id),
+            user_agent VARCHAR,
+            auth_datetime TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            user_device_type TEXT NOT NULL,
+            PRIMARY KEY (id, auth_datetime, user_device_type)
+        ) PARTITION BY LIST (user_device_type)"""
+    )
+    create_partition(None, connection)
+
+    # Existing history must land in monthly partitions, not the default ones
+    first = connection.execute('SELECT min(auth_datetime) FROM login_history_old').scalar()
+    if first:
+        create_month_partitions(
+            connection,
+            first.date(),
+            add_months(datetime.date.today(), LOGIN_HISTORY_PARTITIONS_AHEAD)
+        )
+
+    device_type = 'user_device_type' if 'user_device_type' in old_columns else "'other'"
+    op.execute(
+        f"""INSERT INTO login_history (id, user_id, user_agent, auth_datetime, user_device_type)
+            SELECT id, user_id, user_agent, COALESCE(auth_datetime, now()), COALESCE({device_type}, 'other')
+            FROM login_history_old"""
+    )
+    op.drop_table('login_history_old')
+
+    op.create_index(op.f('ix_login_history_user_id'), 'login_history', ['user_id'], unique=False)
+    op.create_index(
+        'ix_login_history_user_id_auth_datetime',
+        'login_history',
+        ['user_id', sa.text('auth_datetime DESC'), sa.text('id DESC')],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_login_history_user_id_auth_datetime', table_name='login_history')
+    op.drop_index(op.f('ix_login_history_user_id'), table_name='login_history')
+    op.rename_table('login_history', 'login_history_partitioned')
+
+    op.create_table('login_history',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('user_agent', sa.String(), nullable=True),
+    sa.Column('auth_datetime', sa.DateTime(), nullable=True),
+    sa.Column('user_device_type', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('id')
+    )
+    op.execute(
+        """INSERT INTO login_history (id, user_id, user_agent, auth_datetime, user_device_type)
+           SELECT id, user_id, user_agent, auth_datetime, user_device_type
+           FROM login_history_partitioned"""
+    )
+    # Drops every device and monthly partition with it
+    op.drop_table('login_history_partitioned')
+
+    op.create_index(op.f('ix_login_history_user_id'), 'login_history', ['user_id'], unique=False)
+    op.create_index(
+        'ix_login_history_user_id_auth_datetime',
+        'login_history',
+        ['user_id', sa.text('auth_datetime DESC'), sa.text('id DESC')],
+        unique=False
+    )
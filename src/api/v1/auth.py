@@ -1,21 +1,24 @@
+import json
 from http import HTTPStatus
 
-from extensions.cache import redis_db
+from extensions.blocklist import token_blocklist
 from extensions.jwt import jwt
 from extensions.limiter import limiter
 from flask import Blueprint, request
 from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
-from schemas import user_roles
+from serializers import dump_user_roles
 from services.auth_service import auth_service
 
 auth = Blueprint('auth', __name__)
 
+LOGIN_HISTORY_MAX_PER_PAGE = 100
+
 
 @jwt.token_in_blocklist_loader
 def check_if_token_is_revoked(jwt_header, jwt_payload: dict):
     jti = jwt_payload["jti"]
-    token_in_redis = redis_db.get(jti)
-    return token_in_redis is not None
+    # Tokens issued before generations existed count as generation 0
+    return token_blocklist.is_revoked(jti, jwt_payload['sub'], jwt_payload.get('gen', 0))
 
 
 @auth.route('/register', methods=['POST'])
@@ -107,7 +110,8 @@ def refresh():
 @jwt_required(verify_type=False)
 @limiter.limit('1 per second')
 def logout():
-    """Revoke user tokens endpoint. Tokens are added to blocklist untill expiration
+    """Revoke user tokens endpoint. Tokens are added to blocklist untill expiration,
+    an access token is revoked together with its refresh token
     ---
     parameters:
       - name: token
@@ -119,10 +123,27 @@ def logout():
       200:
         description: Return tokens
     """
-    token = get_jwt()
-    jti = token['jti']
-    ttype = token['type']
-    return auth_service.revoke_token(jti, ttype)
+    return auth_service.revoke_token(get_jwt())
+
+
+@auth.route('/logout-all', methods=['POST'])
+@jwt_required(verify_type=False)
+@limiter.limit('1 per second')
+def logout_all():
+    """Revoke every token of the user, e.g. when the account is compromised
+    ---
+    parameters:
+      - name: token
+        in: header
+        type: string
+        required: true
+        description: access or refresh token
+    responses:
+      200:
+        description: All user tokens revoked
+    """
+    identity = get_jwt_identity()
+    return auth_service.revoke_all_tokens(identity)
  
 
 @auth.route('/login-history')
@@ -136,16 +157,37 @@ def login_history():
         in: header
         type: string
         required: true
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor of the previous page, empty for the first page
+      - name: page
+        in: query
+        type: integer
+        required: false
+        description: page number, used when no cursor is given
+      - name: per-page
+        in: query
+        type: integer
+        required: false
     responses:
       200:
         description: Return login history
+      400:
+        description: Wrong cursor, or per-page outside 1..100 with a cursor
       401:
         description: Invalid access token
     """
     page = request.args.get('page', default=1, type=int)
     per_page = request.args.get('per-page', default=10, type=int)
+    cursor = request.args.get('cursor')
+    # Only the cursor mode is capped, the page mode keeps accepting what it always did
+    if cursor is not None and not 1 <= per_page <= LOGIN_HISTORY_MAX_PER_PAGE:
+        return {'message': f'per-page must be between 1 and {LOGIN_HISTORY_MAX_PER_PAGE}.'}, \
+            HTTPStatus.BAD_REQUEST
     identity = get_jwt_identity()
-    return auth_service.get_login_history(identity, page, per_page)
+    return auth_service.get_login_history(identity, page, per_page, cursor)
 
 
 @auth.route('/change-password', methods=['POST'])
@@ -185,8 +227,12 @@ def change_password():
 @limiter.limit('60 per second')
 def check_auth():
     identity = get_jwt_identity()
-    user = auth_service._check_user_exists(identity)
+    roles = auth_service.get_token_roles(get_jwt())
+    if roles is not None:
+        return json.dumps(dump_user_roles({'email': identity, 'roles': roles}))
+
+    user = auth_service.get_cached_user(identity)
     if not user:
         return {'message': 'User does not exist.'}, \
             HTTPStatus.UNAUTHORIZED
-    return user_roles.dumps(user)
+    return json.dumps(dump_user_roles(user))
@@ -1,23 +1,43 @@
+import json
 from functools import wraps
 from http import HTTPStatus
 
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-from models import Role, User
 from services.role_service import role_service
 
 role = Blueprint('role', __name__)
 
 
-def admin_required():
+def read_user_ids():
+    """ User ids of a bulk request: a JSON list, {"users": [...]} or NDJSON lines
+
+    NDJSON is parsed lazily so a large upload never sits in memory whole.
+    Raises ValueError while iterating over a malformed body.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        for line in request.stream:
+            line = line.strip()
+            if line:
+                item = json.loads(line)
+                yield item.get('id') if isinstance(item, dict) else item
+        return
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('users')
+    if not isinstance(data, list):
+        raise ValueError('Expected a list of user ids')
+    yield from data
+
+
+def role_required(*role_names):
     def wrapper(fn):
         @wraps(fn)
         def decorator(*args, **kwargs):
             verify_jwt_in_request()
             identity = get_jwt_identity()
-            user = User.query.filter(User.email == identity).first()
-            admin = Role.query.filter(Role.name == 'admin').first()
-            if admin in user.roles:
+            if role_service.user_has_role(identity, *role_names):
                 return fn(*args, **kwargs)
             else:
                 return jsonify(error='Access forbidden!'), HTTPStatus.FORBIDDEN
@@ -26,7 +46,7 @@ def admin_required():
 
 
 @role.route('/roles', methods=['GET', 'POST', 'DELETE'])
-@admin_required()
+@role_required('admin')
 def roles():
     """Roles endpoint
     ---
@@ -80,9 +100,36 @@ def roles():
 
 
 @role.route('/user/<user_uuid>/<role>', methods=['POST', 'DELETE'])
-@admin_required()
+@role_required('admin')
 def user_role(user_uuid, role):
     if request.method == 'POST':
         return role_service.assign_user_role(user_uuid, role)
     if request.method == 'DELETE':
         return role_service.unassign_user_role(user_uuid, role)
+
+
+@role.route('/roles/<role>/users', methods=['POST', 'DELETE'])
+@role_required('admin')
+def role_users(role):
+    """Bulk role assignment endpoint
+    ---
+    parameters:
+      - name: access_token
+        in: header
+        type: string
+        required: true
+        description: admin access token
+      - name: body
+        in: body
+        required: true
+        description: list of user ids, {"users": [...]} or application/x-ndjson with one id per line
+    responses:
+      200:
+        description: Number of changed assignments per chunk
+      400:
+        description: Role does not exist or malformed body
+    """
+    if request.method == 'POST':
+        return role_service.assign_role_bulk(role, read_user_ids())
+    if request.method == 'DELETE':
+        return role_service.unassign_role_bulk(role, read_user_ids())
@@ -0,0 +1,37 @@
+from extensions.blocklist import token_blocklist
+from extensions.cache import redis_db
+from extensions.db import get_pool_stats
+from extensions.local_cache import user_cache
+from flask import Blueprint, current_app
+from services.utils import get_device_type_cache_stats
+
+from api.v1.role import role_required
+
+stats = Blueprint('stats', __name__)
+
+
+@stats.route('/stats', methods=['GET'])
+@role_required('admin')
+def worker_stats():
+    """Counters of the worker that served the request
+    ---
+    parameters:
+      - name: access_token
+        in: header
+        type: string
+        required: true
+        description: admin access token
+    responses:
+      200:
+        description: Return worker cache, blocklist, connection pool, Redis latency and startup counters
+      403:
+        description: Access forbidden
+    """
+    return {
+        'user_cache': user_cache.stats(),
+        'token_blocklist': token_blocklist.stats(),
+        'device_type_cache': get_device_type_cache_stats(),
+        'db_pool': get_pool_stats(),
+        'redis_commands': redis_db.stats.as_dict(),
+        'startup_ms': current_app.extensions['startup_timings']
+    }
@@ -1,49 +1,87 @@
+import time
+
 from flasgger import Swagger
 from flask import Flask, request
 
 from api.v1.auth import auth
 from api.v1.role import role
 from api.v1.social_auth import social_auth
+from api.v1.stats import stats
 from commands.create_superuser import superuser
+from commands.import_users import users
+from commands.login_history import login_history
+from commands.passwords import passwords
 from config import BaseConfig
-from extensions.bcrypt import init_bcrypt
-from extensions.cache import init_cache
-from extensions.db import init_db
-from extensions.jaeger import init_jaeger
+from extensions.blocklist import init_blocklist
+from extensions.cache import init_cache, redis_db
+from extensions.db import init_db, reset_engine_pool
+from extensions.hashing import init_hashing
+from extensions.jaeger import configure_tracer, init_jaeger
+from extensions.json_provider import init_json_provider
 from extensions.jwt import init_jwt
 from extensions.limiter import init_limiter
+from extensions.local_cache import init_local_cache
+from extensions.metrics import init_metrics
 from extensions.ma import init_schemas
 from extensions.oauth import init_oauth
+from extensions.sql_profiler import init_sql_profiler
+from services import utils
+
+
+class StartupTimer:
+    """ Milliseconds spent in each step of create_app """
+
+    def __init__(self):
+        self.timings = {}
+        self._last = time.perf_counter()
+
+    def step(self, name: str):
+        now = time.perf_counter()
+        self.timings[name] = round((now - self._last) * 1000, 1)
+        self._last = now
 
 
 def create_app():
+    timer = StartupTimer()
     app = Flask(__name__)
     config = BaseConfig()
     app.config.from_object(config)
+    timer.step('config')
 
     swagger = Swagger(app)
+    timer.step('swagger')
 
     # Routes
     app.register_blueprint(auth, url_prefix='/v1')
     app.register_blueprint(role, url_prefix='/v1')
     app.register_blueprint(social_auth, url_prefix='/v1')
+    app.register_blueprint(stats, url_prefix='/v1')
 
     # Commands
     app.register_blueprint(superuser)
+    app.register_blueprint(passwords)
+    app.register_blueprint(login_history)
+    app.register_blueprint(users)
+    timer.step('blueprints')
 
     # Postgres
     init_db(app)
+    init_sql_profiler(app)
 
     # Redis
     init_cache(app)
+    init_local_cache(app)
+    init_blocklist(app)
+    timer.step('storage')
 
     app.app_context().push()
 
     # Marshmallow
     init_schemas(app)
+    init_json_provider(app)
 
-    # Bcrypt
-    init_bcrypt(app)
+    # Password hashing
+    init_hashing(app)
 
     # JWT
     init_jwt(app)
@@ -53,10 +91,30 @@ def create_app():
 
     init_jaeger(app)
 
+    # Prometheus
+    init_metrics(app)
+
     # Limiter
     init_limiter(app)
+    timer.step('extensions')
+
+    # With preload the gunicorn post_fork hook does this in every worker
+    if app.config['APP_PRELOAD']:
+        utils.warm_up()
+    else:
+        init_worker(app)
+    timer.step('worker')
 
+    app.extensions['startup_timings'] = timer.timings
+    app.logger.info('App created in %s ms: %s', sum(timer.timings.values()), timer.timings)
     return app
+
+
+def init_worker(app: Flask):
+    """ Per-process state that must not be shared over fork """
+    reset_engine_pool()
+    redis_db.reset()
+    configure_tracer(app)
     
 
 app = create_app()
@@ -64,6 +122,9 @@ app = create_app()
 
 @app.before_request
 def before_request():
+    # Scrapers don't send request ids
+    if request.endpoint == 'metrics':
+        return
     request_id = request.headers.get('X-Request-Id')
     if not request_id:
         raise RuntimeError('request id is required') 
@@ -1,6 +1,6 @@
 import click
 from extensions.db import db
-from extensions.bcrypt import bcrypt
+from extensions.hashing import password_hasher
 from flask import Blueprint
 from models import Role, User
 
@@ -11,7 +11,7 @@ superuser = Blueprint('superuser', __name__)
 @click.option('--email', help='Admin email.')
 @click.option('--password', help='Admin password.')
 def create(email, password):
-    password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+    password_hash = password_hasher.hash(password)
     user = User(email=email, password=password_hash)
     role = Role.query.filter(Role.name == 'admin').first()
     if not role:
@@ -0,0 +1,268 @@
+import csv
+import io
+import itertools
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+
+import click
+from extensions.db import db
+from extensions.hashing import password_hasher
+from extensions.local_cache import user_cache
+from flask import Blueprint, current_app
+from marshmallow import ValidationError
+from marshmallow.validate import Email
+from services.roles_version import bump_roles_version
+
+users = Blueprint('users', __name__)
+
+ROLE_SEPARATOR = ';'
+# Lengths of the staging columns, longer values would fail the whole chunk
+EMAIL_MAX_LENGTH = 255
+ROLE_MAX_LENGTH = 80
+
+validate_email = Email()
+
+# Emptied by every commit, so a chunk never sees rows of the previous one
+CREATE_STAGING_TABLES = """
+    CREATE TEMP TABLE IF NOT EXISTS import_user (
+        id uuid, email varchar(255), password varchar
+    ) ON COMMIT DELETE ROWS;
+    CREATE TEMP TABLE IF NOT EXISTS import_user_role (
+        email varchar(255), role varchar(80)
+    ) ON COMMIT DELETE ROWS
+"""
+
+INSERT_ROLES = """
+    INSERT INTO role (id, name) VALUES (%s, %s)
+    ON CONFLICT (name) DO NOTHING
+"""
+
+INSERT_USERS = """
+    INSERT INTO "user" (id, email, password, active, confirmed_at)
+    SELECT id, email, password, true, current_date FROM import_user
+    ON CONFLICT (email) DO NOTHING
+"""
+
+# Joined by email, so the links of users a crashed run already inserted
+# are written too
+INSERT_ROLE_LINKS = """
+    INSERT INTO roles_users (user_id, role_id)
+    SELECT "user".id, role.id FROM import_user_role
+    JOIN "user" ON "user".email = import_user_role.email
+    JOIN role ON role.name = import_user_role.role
+    ON CONFLICT DO NOTHING
+"""
+
+
+def read_records(path: str, input_format: str):
+    """ Input records as dicts, a line that isn't valid JSON as its error message """
+    with open(path, newline='', encoding='utf-8') as source:
+        if input_format == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield str(e)
+
+
+def parse_record(record) -> tuple:
+    """ (email, password, password hash, roles) of a record, only one of the passwords is set
+
+    Raises ValueError for records that can't be imported.
+    """
+    if not isinstance(record, dict):
+        raise ValueError(record if isinstance(record, str) else 'Expected an object.')
+
+    email = record.get('email') or ''
+    if not isinstance(email, str):
+        raise ValueError('Expected email to be a string.')
+    email = email.strip()
+    if len(email) > EMAIL_MAX_LENGTH:
+        raise ValueError(f'Email is longer than {EMAIL_MAX_LENGTH} characters.')
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError(f'Invalid email: {email!r}')
+
+    password = record.get('password') or None
+    password_hash = record.get('password_hash') or None
+    if bool(password) == bool(password_hash):
+        raise ValueError('Expected either password or password_hash.')
+    if not isinstance(password or password_hash, str):
+        raise ValueError('Expected password or password_hash to be a string.')
+    # Hashes of other formats would lock the user out, they are rejected
+    if password_hash and not password_hasher.is_hash(password_hash):
+        raise ValueError('Unsupported password hash.')
+
+    roles = record.get('roles') or []
+    if isinstance(roles, str):
+        roles = roles.split(ROLE_SEPARATOR)
+    if not isinstance(roles, list) or not all(isinstance(role, str) for role in roles if role is not None):
+        raise ValueError('Expected roles to be a list of strings.')
+    roles = {role.strip() for role in roles if role and role.strip()}
+    if any(len(role) > ROLE_MAX_LENGTH for role in roles):
+        raise ValueError(f'Role name is longer than {ROLE_MAX_LENGTH} characters.')
+    return email, password, password_hash, roles
+
+
+def to_copy_buffer(rows: list) -> io.StringIO:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    return buffer
+
+
+def hash_passwords(pool: ProcessPoolExecutor, workers: int, passwords: list) -> list:
+    if not passwords:
+        return []
+    chunksize = max(1, len(passwords) // (workers * 4))
+    return list(pool.map(password_hasher.default.hash, passwords, chunksize=chunksize))
+
+
+def write_chunk(connection, users: list, role_links: list, roles: set) -> tuple:
+    """ COPY a chunk to the staging tables and merge it in one transaction.
+
+    Returns the number of users and role links inserted, conflicting rows
+    are skipped so a chunk can be written again after a crash.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_STAGING_TABLES)
+            if roles:
+                cursor.executemany(INSERT_ROLES, [(str(uuid.uuid4()), role) for role in sorted(roles)])
+            cursor.copy_expert(
+                'COPY import_user (id, email, password) FROM STDIN WITH (FORMAT csv)',
+                to_copy_buffer(users)
+            )
+            cursor.copy_expert(
+                'COPY import_user_role (email, role) FROM STDIN WITH (FORMAT csv)',
+                to_copy_buffer(role_links)
+            )
+            cursor.execute(INSERT_USERS)
+            inserted = cursor.rowcount
+            cursor.execute(INSERT_ROLE_LINKS)
+            linked = cursor.rowcount
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return inserted, linked
+
+
+def load_state(path: str, source: str, restart: bool = False) -> dict:
+    state = {'source': source, 'records': 0, 'users': 0, 'existing': 0,
+             'role_links': 0, 'rejected': 0, 'finished': False}
+    if restart or not os.path.exists(path):
+        return state
+    with open(path) as state_file:
+        saved = json.load(state_file)
+    if saved['source'] != source:
+        raise click.UsageError(f'{path} belongs to the import of {saved["source"]}, use --restart.')
+    state.update(saved)
+    return state
+
+
+def save_state(path: str, state: dict):
+    # A crash while writing must leave the previous state intact
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as state_file:
+        json.dump(state, state_file)
+        state_file.flush()
+        os.fsync(state_file.fileno())
+    os.replace(temporary, path)
+
+
+@users.cli.command('import')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'input_format', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Input format, by default from the file extension.')
+@click.option('--chunk-size', type=int, default=None, help='Records per transaction.')
+@click.option('--workers', type=int, default=None, help='Password hashing processes, all CPUs by default.')
+@click.option('--state-file', default=None, help='Progress file to resume from, SOURCE.state by default.')
+@click.option('--restart', is_flag=True, help='Ignore the progress of previous runs.')
+@click.option('--rejects', type=click.File('a'), default=None, help='Append rejected records here.')
+def import_users(source, input_format, chunk_size, workers, state_file, restart, rejects):
+    """Import users from CSV or NDJSON with email, password or password_hash and roles.
+
+    Plaintext passwords are hashed with the configured scheme in a process
+    pool, bcrypt and argon2id hashes are stored as they are. Users already
+    registered under an email are kept, their listed roles are added.
+    """
+    source = os.path.abspath(source)
+    input_format = input_format or ('csv' if source.endswith('.csv') else 'ndjson')
+    chunk_size = chunk_size or current_app.config['USER_IMPORT_CHUNK_SIZE']
+    workers = workers or os.cpu_count()
+    state_file = state_file or f'{source}.state'
+
+    state = load_state(state_file, source, restart)
+    if state['finished']:
+        click.echo(f'{source} is already imported, use --restart to import it again.')
+        return
+    if state['records']:
+        click.echo(f'Resuming after {state["records"]} records.')
+
+    records = itertools.islice(read_records(source, input_format), state['records'], None)
+    started = time.perf_counter()
+    imported = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, closing(db.engine.raw_connection()) as connection:
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+
+            parsed = []
+            for number, record in enumerate(chunk, state['records'] + 1):
+                try:
+                    parsed.append(parse_record(record))
+                except ValueError as e:
+                    state['rejected'] += 1
+                    if rejects:
+                        rejects.write(json.dumps({'record': number, 'error': str(e)}) + '\n')
+
+            hash_started = time.perf_counter()
+            hashes = iter(hash_passwords(pool, workers, [password for _, password, _, _ in parsed if password]))
+            hash_ms = (time.perf_counter() - hash_started) * 1000
+
+            chunk_users = [
+                (str(uuid.uuid4()), email, password_hash or next(hashes))
+                for email, _, password_hash, _ in parsed
+            ]
+            role_links = [(email, role) for email, _, _, roles in parsed for role in roles]
+            roles = {role for _, role in role_links}
+
+            write_started = time.perf_counter()
+            inserted, linked = write_chunk(connection, chunk_users, role_links, roles) if chunk_users else (0, 0)
+            write_ms = (time.perf_counter() - write_started) * 1000
+
+            state['records'] += len(chunk)
+            state['users'] += inserted
+            state['existing'] += len(chunk_users) - inserted
+            state['role_links'] += linked
+            save_state(state_file, state)
+            if rejects:
+                rejects.flush()
+
+            imported += len(chunk)
+            click.echo(
+                f'records={state["records"]} users={state["users"]} '
+                f'existing={state["existing"]} role_links={state["role_links"]} '
+                f'rejected={state["rejected"]} hash_ms={hash_ms:.0f} write_ms={write_ms:.0f} '
+                f'rate={imported / (time.perf_counter() - started):.0f}/s'
+            )
+
+    state['finished'] = True
+    save_state(state_file, state)
+    if state['role_links']:
+        # Users that existed before may have got new roles
+        bump_roles_version()
+        user_cache.invalidate()
+    click.echo(f'Imported {state["users"]} users from {state["records"]} records.')
@@ -0,0 +1,147 @@
+import datetime
+import re
+import socket
+import time
+
+import click
+from extensions.db import db
+from flask import Blueprint, current_app
+from models import (LOGIN_HISTORY_DEVICE_TYPES, LOGIN_HISTORY_PARTITIONS_AHEAD,
+                    LoginHistory, add_months, create_month_partitions)
+from services.login_history_stream import login_history_stream
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError
+
+login_history = Blueprint('login-history', __name__)
+
+MONTH_PARTITION_RE = re.compile(r'_y(\d{4})m(\d{2})$')
+
+
+def insert_records(records: list):
+    statement = insert(LoginHistory.__table__) \
+        .values(records) \
+        .on_conflict_do_nothing()
+    db.session.execute(statement)
+
+
+def write_batch(events: list) -> int:
+    """ Write and ack the events, returns how many of them were dead-lettered """
+    rejected = []
+    try:
+        insert_records([record for _, record in events])
+        db.session.commit()
+    except (IntegrityError, DataError):
+        db.session.rollback()
+        # One bad event (e.g. of a deleted user) must not hold up the rest,
+        # find it row by row. Connection errors still stop the consumer
+        for entry_id, record in events:
+            try:
+                with db.session.begin_nested():
+                    insert_records([record])
+            except (IntegrityError, DataError) as e:
+                rejected.append((entry_id, record, str(e.orig).strip()))
+        db.session.commit()
+
+    for entry_id, record, error in rejected:
+        login_history_stream.dead_letter(entry_id, record, error)
+    login_history_stream.ack([entry_id for entry_id, _ in events])
+    return len(rejected)
+
+
+def flush_batch(events: list):
+    started = time.perf_counter()
+    dead = write_batch(events)
+    lag = login_history_stream.lag()
+    click.echo(
+        f'batch={len(events)} dead_lettered={dead} '
+        f'write_ms={(time.perf_counter() - started) * 1000:.1f} '
+        f'pending={lag["pending"]} undelivered={lag["undelivered"]} '
+        f'stream_length={lag["stream_length"]}'
+    )
+
+
+@login_history.cli.command('consume')
+@click.option('--consumer', default=socket.gethostname, help='Consumer name in the group.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=None,
+              help='Flush once this many events are buffered.')
+@click.option('--flush-interval', type=float, default=None, help='Flush buffered events after this many seconds.')
+def consume(consumer, batch_size, flush_interval):
+    """Write queued login events to login_history in multi-row batches."""
+    batch_size = batch_size or current_app.config['LOGIN_HISTORY_BATCH_SIZE']
+    flush_interval = flush_interval or current_app.config['LOGIN_HISTORY_FLUSH_INTERVAL']
+
+    login_history_stream.create_group()
+    # Events read before a crash are still pending for this consumer, all of
+    # them are written before new ones are read
+    for events in login_history_stream.read_pending(consumer, batch_size):
+        if events:
+            flush_batch(events)
+
+    events = []
+    flush_at = time.monotonic() + flush_interval
+    while True:
+        wait_ms = max(1, int((flush_at - time.monotonic()) * 1000))
+        # The buffer is flushed once full, there is always room for one more
+        events += login_history_stream.read(consumer, batch_size - len(events), wait_ms)
+
+        if len(events) < batch_size and time.monotonic() < flush_at:
+            continue
+
+        if events:
+            flush_batch(events)
+        events = []
+        flush_at = time.monotonic() + flush_interval
+
+
+def month_partitions(connection, device_type: str):
+    """ (name, month) of the monthly partitions under a device partition """
+    names = connection.execute(
+        """SELECT child.relname FROM pg_inherits
+           JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+           JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+           WHERE parent.relname = %s""",
+        (f'login_history_{device_type}', )
+    ).scalars()
+    for name in names:
+        match = MONTH_PARTITION_RE.search(name)
+        if match:
+            yield name, datetime.date(int(match[1]), int(match[2]), 1)
+
+
+@login_history.cli.command('partitions')
+@click.option('--months-ahead', type=int, default=LOGIN_HISTORY_PARTITIONS_AHEAD,
+              help='Months to pre-create partitions for.')
+@click.option('--retention-months', type=int, default=None,
+              help='Months of history to keep, older partitions are removed.')
+@click.option('--detach-only', is_flag=True, help='Detach expired partitions instead of dropping them.')
+def partitions(months_ahead, retention_months, detach_only):
+    """Pre-create upcoming monthly partitions and remove expired ones."""
+    retention_months = retention_months or current_app.config['LOGIN_HISTORY_RETENTION_MONTHS']
+    this_month = datetime.date.today().replace(day=1)
+    # Partitions ending before this month hold history past the retention window
+    keep_from = add_months(this_month, -retention_months)
+
+    # Creation and retention run in separate transactions, a failure of one doesn't undo the other
+    creation_error = None
+    try:
+        with db.engine.begin() as connection:
+            created = create_month_partitions(connection, this_month, add_months(this_month, months_ahead))
+        click.echo(f'Partitions up to date: {len(created)}')
+    except DBAPIError as error:
+        creation_error = error
+        click.echo(f'Creating partitions failed: {error.orig}', err=True)
+
+    with db.engine.begin() as connection:
+        for device_type in LOGIN_HISTORY_DEVICE_TYPES:
+            for name, month in month_partitions(connection, device_type):
+                if month >= keep_from:
+                    continue
+                connection.execute(f'ALTER TABLE "login_history_{device_type}" DETACH PARTITION "{name}"')
+                if detach_only:
+                    click.echo(f'Detached {name}')
+                else:
+                    connection.execute(f'DROP TABLE "{name}"')
+                    click.echo(f'Dropped {name}')
+
+    if creation_error is not None:
+        raise click.ClickException('Some partitions were not created.')
@@ -0,0 +1,50 @@
+import time
+
+import click
+from extensions.hashing import Argon2Scheme, BcryptScheme
+from flask import Blueprint, current_app
+
+passwords = Blueprint('passwords', __name__)
+
+SAMPLE_PASSWORD = 'calibration123'
+
+
+def measure(scheme, samples: int) -> float:
+    pw_hash = scheme.hash(SAMPLE_PASSWORD)
+    started = time.perf_counter()
+    for _ in range(samples):
+        scheme.verify(pw_hash, SAMPLE_PASSWORD)
+    return (time.perf_counter() - started) / samples * 1000
+
+
+@passwords.cli.command('calibrate')
+@click.option('--scheme', type=click.Choice(['bcrypt', 'argon2id']), default='bcrypt')
+@click.option('--target-ms', type=float, default=250, help='Hash time to aim for on this host.')
+@click.option('--samples', type=int, default=3, help='Hashes measured per cost.')
+def calibrate(scheme, target_ms, samples):
+    """Pick the highest cost whose hash time stays under the target."""
+    if scheme == 'bcrypt':
+        costs = range(4, 32)
+        build = lambda cost: BcryptScheme(rounds=cost)  # noqa: E731
+        setting = 'BCRYPT_LOG_ROUNDS'
+    else:
+        costs = range(1, 64)
+        build = lambda cost: Argon2Scheme(  # noqa: E731
+            time_cost=cost,
+            memory_cost=current_app.config['ARGON2_MEMORY_COST'],
+            parallelism=current_app.config['ARGON2_PARALLELISM']
+        )
+        setting = 'ARGON2_TIME_COST'
+
+    chosen = None
+    for cost in costs:
+        elapsed = measure(build(cost), samples)
+        click.echo(f'{scheme} cost {cost}: {elapsed:.1f} ms')
+        if elapsed > target_ms:
+            break
+        chosen = cost
+
+    if chosen is None:
+        click.echo(f'Even the lowest cost takes longer than {target_ms} ms.')
+        return
+    click.echo(f'{setting}={chosen}')
@@ -1,4 +1,6 @@
 import os
+from typing import Dict
+
 from pydantic import BaseSettings, Field, BaseModel
 
 from dotenv import load_dotenv
@@ -22,9 +24,111 @@ class BaseConfig(BaseSettings):
     POSTGRES_USER: str = Field('postgres', env='POSTGRES_USER')
     POSTGRES_PASSWORD: str = Field('123456', env='POSTGRES_PASSWORD')
     POSTGRES_DATABASE: str = Field('auth_database', env='POSTGRES_DATABASE')
+    # Size the pool for the greenlets of one worker
+    POSTGRES_POOL_SIZE: int = Field(10, env='POSTGRES_POOL_SIZE')
+    POSTGRES_MAX_OVERFLOW: int = Field(10, env='POSTGRES_MAX_OVERFLOW')
+    POSTGRES_POOL_TIMEOUT: int = Field(30, env='POSTGRES_POOL_TIMEOUT')
+    POSTGRES_POOL_RECYCLE: int = Field(1800, env='POSTGRES_POOL_RECYCLE')
+    POSTGRES_POOL_PRE_PING: bool = Field(True, env='POSTGRES_POOL_PRE_PING')
+    # Behind PgBouncer in transaction pooling mode
+    POSTGRES_PGBOUNCER: bool = Field(False, env='POSTGRES_PGBOUNCER')
+    # Yield to the gevent hub during queries when running under gevent
+    POSTGRES_GEVENT: bool = Field(True, env='POSTGRES_GEVENT')
 
     REDIS_HOST: str = Field('127.0.0.1', env='REDIS_HOST')
     REDIS_PORT: int = Field(6379, env='REDIS_PORT')
+    # Size the pool for the greenlets of one worker
+    REDIS_MAX_CONNECTIONS: int = Field(50, env='REDIS_MAX_CONNECTIONS')
+    REDIS_POOL_TIMEOUT: float = Field(5.0, env='REDIS_POOL_TIMEOUT')
+    REDIS_SOCKET_TIMEOUT: float = Field(1.0, env='REDIS_SOCKET_TIMEOUT')
+    REDIS_CONNECT_TIMEOUT: float = Field(1.0, env='REDIS_CONNECT_TIMEOUT')
+    REDIS_HEALTH_CHECK_INTERVAL: int = Field(30, env='REDIS_HEALTH_CHECK_INTERVAL')
+
+    # Rate limits shared by all workers, in the service's Redis (db 1) unless set.
+    # Keyed by JWT identity or client address, floods cut off per worker first.
+    # The real-IP header is only taken from the trusted proxies (addresses or CIDRs)
+    RATELIMIT_STORAGE_URI: str = Field('', env='RATELIMIT_STORAGE_URI')
+    RATELIMIT_STRATEGY: str = Field('moving-window', env='RATELIMIT_STRATEGY')
+    RATELIMIT_SWALLOW_ERRORS: bool = Field(True, env='RATELIMIT_SWALLOW_ERRORS')
+    RATELIMIT_REAL_IP_HEADER: str = Field('X-Real-IP', env='RATELIMIT_REAL_IP_HEADER')
+    RATELIMIT_TRUSTED_PROXIES: str = Field('127.0.0.1,::1', env='RATELIMIT_TRUSTED_PROXIES')
+    RATELIMIT_LOCAL_RATE: float = Field(20, env='RATELIMIT_LOCAL_RATE')
+    RATELIMIT_LOCAL_BURST: int = Field(40, env='RATELIMIT_LOCAL_BURST')
+
+    # Answer /check-auth from the role claims of the access token
+    JWT_STATELESS_CHECK_AUTH: bool = Field(False, env='JWT_STATELESS_CHECK_AUTH')
+
+    # Per-worker cache of user roles, invalidated over Redis pub/sub
+    USER_CACHE_SIZE: int = Field(10000, env='USER_CACHE_SIZE')
+    USER_CACHE_TTL: int = Field(60, env='USER_CACHE_TTL')
+
+    # Per-worker Bloom filter of revoked tokens in front of the Redis blocklist
+    BLOCKLIST_FILTER_ENABLED: bool = Field(True, env='BLOCKLIST_FILTER_ENABLED')
+    BLOCKLIST_FILTER_CAPACITY: int = Field(1_000_000, env='BLOCKLIST_FILTER_CAPACITY')
+    BLOCKLIST_FILTER_ERROR_RATE: float = Field(0.001, env='BLOCKLIST_FILTER_ERROR_RATE')
+
+    # Where password hashing runs: inline, thread or process
+    PASSWORD_HASHING_EXECUTOR: str = Field('thread', env='PASSWORD_HASHING_EXECUTOR')
+    PASSWORD_HASHING_POOL_SIZE: int = Field(4, env='PASSWORD_HASHING_POOL_SIZE')
+
+    # Scheme of new password hashes, outdated ones are rehashed on login
+    PASSWORD_HASH_SCHEME: str = Field('bcrypt', env='PASSWORD_HASH_SCHEME')
+    BCRYPT_LOG_ROUNDS: int = Field(12, env='BCRYPT_LOG_ROUNDS')
+    ARGON2_TIME_COST: int = Field(3, env='ARGON2_TIME_COST')
+    ARGON2_MEMORY_COST: int = Field(65536, env='ARGON2_MEMORY_COST')
+    ARGON2_PARALLELISM: int = Field(4, env='ARGON2_PARALLELISM')
+
+    # Queue login history in a Redis stream drained by `flask login-history consume`
+    LOGIN_HISTORY_ASYNC: bool = Field(False, env='LOGIN_HISTORY_ASYNC')
+    LOGIN_HISTORY_STREAM_MAXLEN: int = Field(1_000_000, env='LOGIN_HISTORY_STREAM_MAXLEN')
+    LOGIN_HISTORY_BATCH_SIZE: int = Field(500, env='LOGIN_HISTORY_BATCH_SIZE')
+    LOGIN_HISTORY_FLUSH_INTERVAL: float = Field(1.0, env='LOGIN_HISTORY_FLUSH_INTERVAL')
+
+    # Monthly login_history partitions kept by `flask login-history partitions`
+    LOGIN_HISTORY_RETENTION_MONTHS: int = Field(12, env='LOGIN_HISTORY_RETENTION_MONTHS')
+
+    # Tracing: comma-separated exporters (jaeger, console, none), parent-based ratio sampling
+    # per route, failed and slow requests exported regardless of the draw
+    JAEGER_HOST: str = Field('localhost', env='JAEGER_HOST')
+    JAEGER_PORT: int = Field(6831, env='JAEGER_PORT')
+    TRACING_EXPORTERS: str = Field('jaeger', env='TRACING_EXPORTERS')
+    TRACING_SAMPLE_RATIO: float = Field(0.1, env='TRACING_SAMPLE_RATIO')
+    TRACING_ROUTE_SAMPLE_RATIOS: Dict[str, float] = Field(
+        {'/v1/check-auth': 0.001}, env='TRACING_ROUTE_SAMPLE_RATIOS'
+    )
+    TRACING_TAIL_CAPTURE: bool = Field(True, env='TRACING_TAIL_CAPTURE')
+    TRACING_SLOW_REQUEST_MS: float = Field(500, env='TRACING_SLOW_REQUEST_MS')
+    TRACING_MAX_QUEUE_SIZE: int = Field(2048, env='TRACING_MAX_QUEUE_SIZE')
+    TRACING_SCHEDULE_DELAY_MS: int = Field(5000, env='TRACING_SCHEDULE_DELAY_MS')
+    TRACING_MAX_EXPORT_BATCH_SIZE: int = Field(512, env='TRACING_MAX_EXPORT_BATCH_SIZE')
+    TRACING_EXPORT_TIMEOUT_MS: int = Field(30000, env='TRACING_EXPORT_TIMEOUT_MS')
+
+    # App built once in the gunicorn master, connections and exporters set up in post_fork
+    APP_PRELOAD: bool = Field(False, env='APP_PRELOAD')
+
+    # Users per transaction of the bulk role endpoints
+    ROLE_BULK_CHUNK_SIZE: int = Field(1000, env='ROLE_BULK_CHUNK_SIZE')
+
+    # Per-request SQL counters as X-DB-* headers (always on in debug) and slow query log
+    SQL_PROFILER_HEADERS: bool = Field(False, env='SQL_PROFILER_HEADERS')
+    SQL_SLOW_QUERY_MS: float = Field(100, env='SQL_SLOW_QUERY_MS')
+
+    # Redis set of registered emails checked before hashing the password of a registration
+    REGISTRATION_PRECHECK: bool = Field(False, env='REGISTRATION_PRECHECK')
+
+    # Records per COPY transaction of `flask users import`
+    USER_IMPORT_CHUNK_SIZE: int = Field(5000, env='USER_IMPORT_CHUNK_SIZE')
+
+    # JSON encoder of the hot-path responses: orjson or flask
+    JSON_PROVIDER: str = Field('orjson', env='JSON_PROVIDER')
+
+    # Keep-alive HTTP client of the OAuth providers, failed connects are retried
+    OAUTH_CONNECT_TIMEOUT: float = Field(3.0, env='OAUTH_CONNECT_TIMEOUT')
+    OAUTH_READ_TIMEOUT: float = Field(10.0, env='OAUTH_READ_TIMEOUT')
+    OAUTH_RETRIES: int = Field(2, env='OAUTH_RETRIES')
+    OAUTH_POOL_SIZE: int = Field(10, env='OAUTH_POOL_SIZE')
+    # Seconds repeat social logins are answered from Redis
+    SOCIAL_ACCOUNT_CACHE_TTL: int = Field(86400, env='SOCIAL_ACCOUNT_CACHE_TTL')
 
     OAUTH_CREDENTIALS = {
         'yandex': OAuthProvider(
@@ -1,8 +0,0 @@
-from flask import Flask
-from flask_bcrypt import Bcrypt
-
-bcrypt = Bcrypt()
-
-
-def init_bcrypt(app: Flask):
-    bcrypt.init_app(app)
@@ -0,0 +1,236 @@
+import datetime
+import hashlib
+import math
+import os
+import threading
+import time
+
+from flask import Flask
+
+from extensions.cache import redis_db
+from extensions.metrics import BLOCKLIST_CHECKS
+
+
+class BloomFilter:
+    """ Fixed-size Bloom filter of strings.
+
+    For `capacity` items and a target false-positive rate p it takes
+    m = -capacity * ln(p) / ln(2)^2 bits and k = m / capacity * ln(2) hashes,
+    e.g. 1M items at p = 0.001 fit in ~1.7 MiB with 10 hashes. Past
+    `capacity` items the false-positive rate grows, it never gives
+    false negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str):
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    @property
+    def memory(self):
+        return len(self._bits)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions out of one 128-bit digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+
+class TokenBlocklist:
+    """ Redis blocklist of revoked JTIs with a per-worker Bloom filter in front.
+
+    Every revocation is also appended to a Redis stream that each worker
+    tails into its filter. A JTI missing from the filter was never revoked,
+    so the Redis lookup is skipped. Until the filter has caught up with the
+    stream (worker start, Redis errors, rebuild after overflow) every check
+    goes to Redis.
+
+    Besides single tokens a user's whole session set can be revoked by
+    bumping their token generation: tokens carry the generation they were
+    issued at and anything older is revoked. Bumps travel on the same
+    stream, so a synced worker checks generations locally too.
+    """
+
+    STREAM_KEY = 'revoked_tokens'
+    GENERATION_KEY = 'token_generation:{0}'
+    READ_BLOCK_MS = 5000
+    RETRY_SECONDS = 5
+    REBUILD_SECONDS = 300
+
+    def __init__(self):
+        self.enabled = True
+        self.capacity = 1_000_000
+        self.error_rate = 0.001
+        self.max_expiration = datetime.timedelta(days=30)
+        self.filter_skips = 0
+        self.redis_lookups = 0
+        self.false_positives = 0
+        self._filter = None
+        self._generations = {}
+        self._synced = False
+        self._reader_pid = None
+        self._reader_lock = threading.Lock()
+
+    def init_app(self, app: Flask):
+        self.enabled = app.config['BLOCKLIST_FILTER_ENABLED']
+        self.capacity = app.config['BLOCKLIST_FILTER_CAPACITY']
+        self.error_rate = app.config['BLOCKLIST_FILTER_ERROR_RATE']
+
+    def revoke(self, tokens: dict):
+        """ Block every {jti: expires} token in one round trip """
+        pipeline = redis_db.pipeline()
+        for jti, expires in tokens.items():
+            pipeline.set(jti, '', expires)
+            pipeline.xadd(self.STREAM_KEY, {'jti': jti}, minid=self._min_stream_id())
+        redis_db.execute(pipeline)
+        if self._synced:
+            for jti in tokens:
+                self._filter.add(jti)
+
+    def revoke_all(self, identity: str) -> int:
+        """ Revoke every token issued to the user so far, returns the new generation """
+        generation = redis_db.incr(self.GENERATION_KEY.format(identity))
+        redis_db.xadd(
+            self.STREAM_KEY,
+            {'identity': identity, 'generation': generation},
+            minid=self._min_stream_id()
+        )
+        if self._synced:
+            self._set_generation(identity, generation)
+        return generation
+
+    def generation(self, identity: str) -> int:
+        """ Generation to embed in newly issued tokens, always read from Redis """
+        return int(redis_db.get(self.GENERATION_KEY.format(identity)) or 0)
+
+    def is_revoked(self, jti: str, identity: str = None, generation: int = 0) -> bool:
+        if self.enabled:
+            self._ensure_reader()
+        if self._synced:
+            if generation < self._generations.get(identity, 0):
+                BLOCKLIST_CHECKS.labels('generation', 'true').inc()
+                return True
+            if jti not in self._filter:
+                self.filter_skips += 1
+                BLOCKLIST_CHECKS.labels('filter', 'false').inc()
+                return False
+            self.redis_lookups += 1
+            revoked = redis_db.get(jti) is not None
+            if not revoked:
+                self.false_positives += 1
+            BLOCKLIST_CHECKS.labels('redis', str(revoked).lower()).inc()
+            return revoked
+
+        # JTI and generation in one round trip
+        self.redis_lookups += 1
+        pipeline = redis_db.pipeline()
+        pipeline.get(jti)
+        pipeline.get(self.GENERATION_KEY.format(identity))
+        revoked, current = redis_db.execute(pipeline)
+        revoked = revoked is not None or generation < int(current or 0)
+        BLOCKLIST_CHECKS.labels('redis', str(revoked).lower()).inc()
+        return revoked
+
+    def stats(self):
+        return {
+            'synced': self._synced,
+            'filter_skips': self.filter_skips,
+            'redis_lookups': self.redis_lookups,
+            'false_positives': self.false_positives,
+            'filter_count': self._filter.count if self._filter else 0,
+            'filter_capacity': self._filter.capacity if self._filter else 0,
+            'generations': len(self._generations),
+            'filter_memory': self._filter.memory if self._filter else 0
+        }
+
+    def _min_stream_id(self):
+        # Entries older than the longest token lifetime can't block anything
+        return int((time.time() - self.max_expiration.total_seconds()) * 1000)
+
+    def _ensure_reader(self):
+        # Reader thread doesn't survive a fork, start it once per worker
+        if self._reader_pid == os.getpid():
+            return
+        with self._reader_lock:
+            if self._reader_pid == os.getpid():
+                return
+            self._synced = False
+            self._reader_pid = os.getpid()
+            threading.Thread(target=self._read_stream, daemon=True).start()
+
+    def _read_stream(self):
+        while True:
+            try:
+                last_id = self._rebuild()
+                rebuild_at = None
+                while rebuild_at is None or time.monotonic() < rebuild_at:
+                    last_id = self._consume(last_id)
+                    if rebuild_at is None and self._filter.count > self._filter.capacity:
+                        # An overfull filter stops answering, checks go to Redis
+                        # until a rebuild sized for the stream as it is by then
+                        self._synced = False
+                        rebuild_at = time.monotonic() + self.REBUILD_SECONDS
+            except Exception:
+                self._synced = False
+                time.sleep(self.RETRY_SECONDS)
+
+    def _rebuild(self):
+        self._synced = False
+        # Entries live as long as the longest token, so the stream can't be
+        # cut to the filter's size; the filter grows to the stream instead
+        capacity = max(self.capacity, redis_db.xlen(self.STREAM_KEY) * 2)
+        self._filter = BloomFilter(capacity, self.error_rate)
+        self._generations = {}
+        last_id = '-'
+        while True:
+            start = last_id if last_id == '-' else f'({last_id}'
+            entries = redis_db.xrange(self.STREAM_KEY, min=start, count=10000)
+            if not entries:
+                break
+            for entry_id, fields in entries:
+                self._apply(fields)
+            last_id = entries[-1][0].decode('utf-8')
+        self._synced = self._filter.count <= self._filter.capacity
+        return '0' if last_id == '-' else last_id
+
+    def _consume(self, last_id: str):
+        response = redis_db.xread({self.STREAM_KEY: last_id}, block=self.READ_BLOCK_MS)
+        for _, entries in response:
+            for entry_id, fields in entries:
+                self._apply(fields)
+                last_id = entry_id.decode('utf-8')
+        return last_id
+
+    def _apply(self, fields: dict):
+        if b'jti' in fields:
+            self._filter.add(fields[b'jti'].decode('utf-8'))
+        else:
+            self._set_generation(fields[b'identity'].decode('utf-8'), int(fields[b'generation']))
+
+    def _set_generation(self, identity: str, generation: int):
+        # Stream entries may arrive after the local update, never go back
+        if generation > self._generations.get(identity, 0):
+            self._generations[identity] = generation
+
+
+token_blocklist = TokenBlocklist()
+
+
+def init_blocklist(app: Flask):
+    token_blocklist.init_app(app)
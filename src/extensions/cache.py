@@ -1,4 +1,6 @@
 import abc
+import time
+
 import redis
 from flask import Flask
 
@@ -12,22 +14,137 @@ class AbstractCache(abc.ABC):
         pass
 
 
+class CommandStats:
+    """ Count, total and max latency per Redis command """
+
+    def __init__(self):
+        self.commands = {}
+
+    def observe(self, command: str, seconds: float):
+        count, total, maximum = self.commands.get(command, (0, 0.0, 0.0))
+        self.commands[command] = (count + 1, total + seconds, max(maximum, seconds))
+
+    def as_dict(self):
+        return {
+            command: {
+                'count': count,
+                'avg_ms': total / count * 1000,
+                'max_ms': maximum * 1000
+            }
+            for command, (count, total, maximum) in self.commands.items()
+        }
+
+
 class RedisCache(AbstractCache):
+    """ Redis client on a bounded connection pool with per-command latency.
+
+    Blocking reads (stream tailing, pub/sub) hold a connection for long and
+    can't have a socket timeout, they go through a separate `blocking` client.
+    """
+
     def __init__(self):
         self.redis = None
-    
+        self.blocking = None
+        self.stats = CommandStats()
+
     def init_app(self, app: Flask):
-        self.redis = redis.Redis(
-            host=app.config['REDIS_HOST'],
-            port=app.config['REDIS_PORT'],
-            db=0
+        connection_kwargs = {
+            'host': app.config['REDIS_HOST'],
+            'port': app.config['REDIS_PORT'],
+            'db': 0,
+            'socket_connect_timeout': app.config['REDIS_CONNECT_TIMEOUT'],
+            'health_check_interval': app.config['REDIS_HEALTH_CHECK_INTERVAL']
+        }
+        # Greenlets wait for a free connection instead of opening new ones
+        pool = redis.BlockingConnectionPool(
+            max_connections=app.config['REDIS_MAX_CONNECTIONS'],
+            timeout=app.config['REDIS_POOL_TIMEOUT'],
+            socket_timeout=app.config['REDIS_SOCKET_TIMEOUT'],
+            **connection_kwargs
         )
+        self.redis = redis.Redis(connection_pool=pool)
+        self.blocking = redis.Redis(**connection_kwargs)
+
+    def reset(self):
+        """ Forget connections inherited over fork without closing the parent's sockets """
+        self.redis.connection_pool.reset()
+        self.blocking.connection_pool.reset()
 
     def set(self, *args, **kwargs):
-        self.redis.set(*args, **kwargs)
-    
+        self._execute('set', *args, **kwargs)
+
     def get(self, *args, **kwargs):
-        return self.redis.get(*args, **kwargs)
+        return self._execute('get', *args, **kwargs)
+
+    def get_many(self, *keys):
+        return self._execute('mget', keys)
+
+    def set_many(self, mapping: dict, ex=None):
+        """ Set every key in one round trip, with an optional common expiration """
+        pipeline = self.pipeline()
+        for key, value in mapping.items():
+            pipeline.set(key, value, ex=ex)
+        return self.execute(pipeline)
+
+    def pipeline(self, transaction: bool = False):
+        return self.redis.pipeline(transaction=transaction)
+
+    def execute(self, pipeline):
+        """ Send the commands queued on the pipeline in one round trip """
+        started = time.perf_counter()
+        try:
+            return pipeline.execute()
+        finally:
+            self.stats.observe('pipeline', time.perf_counter() - started)
+
+    def incr(self, *args, **kwargs):
+        return self._execute('incr', *args, **kwargs)
+
+    def sadd(self, *args, **kwargs):
+        return self._execute('sadd', *args, **kwargs)
+
+    def sismember(self, *args, **kwargs):
+        return self._execute('sismember', *args, **kwargs)
+
+    def xadd(self, *args, **kwargs):
+        return self._execute('xadd', *args, **kwargs)
+
+    def xrange(self, *args, **kwargs):
+        return self._execute('xrange', *args, **kwargs)
+
+    def xread(self, *args, **kwargs):
+        return self.blocking.xread(*args, **kwargs)
+
+    def xreadgroup(self, *args, **kwargs):
+        return self.blocking.xreadgroup(*args, **kwargs)
+
+    def xack(self, *args, **kwargs):
+        return self._execute('xack', *args, **kwargs)
+
+    def xgroup_create(self, *args, **kwargs):
+        return self._execute('xgroup_create', *args, **kwargs)
+
+    def xpending(self, *args, **kwargs):
+        return self._execute('xpending', *args, **kwargs)
+
+    def xinfo_groups(self, *args, **kwargs):
+        return self._execute('xinfo_groups', *args, **kwargs)
+
+    def xlen(self, *args, **kwargs):
+        return self._execute('xlen', *args, **kwargs)
+
+    def publish(self, *args, **kwargs):
+        return self._execute('publish', *args, **kwargs)
+
+    def pubsub(self, **kwargs):
+        return self.blocking.pubsub(**kwargs)
+
+    def _execute(self, command: str, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return getattr(self.redis, command)(*args, **kwargs)
+        finally:
+            self.stats.observe(command, time.perf_counter() - started)
 
 
 redis_db = RedisCache()
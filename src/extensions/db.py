@@ -1,9 +1,97 @@
+import time
+
+import psycopg2
+from extensions.metrics import DB_POOL_WAIT
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from gevent import monkey
+from gevent.socket import wait_read, wait_write
+from psycopg2 import extensions
+from sqlalchemy.pool import NullPool, QueuePool
 
 db = SQLAlchemy()
 
 
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def observe_wait(self, seconds: float):
+        self.checkouts += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """ QueuePool recording how long checkouts wait for a free connection """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            pool_stats.observe_wait(waited)
+            DB_POOL_WAIT.observe(waited)
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """ Wait for psycopg2 I/O on the gevent hub instead of blocking it (psycogreen) """
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f'Bad result from poll: {state}')
+
+
+def get_pool_stats():
+    pool = db.engine.pool
+    stats = {
+        'pool': type(pool).__name__,
+        'checkouts': pool_stats.checkouts,
+        'wait_avg_ms': pool_stats.wait_total / pool_stats.checkouts * 1000 if pool_stats.checkouts else 0.0,
+        'wait_max_ms': pool_stats.wait_max * 1000
+    }
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=pool.overflow()
+        )
+    return stats
+
+
+def engine_options(app: Flask) -> dict:
+    if app.config['POSTGRES_PGBOUNCER']:
+        # PgBouncer in transaction mode does the pooling, a connection must
+        # not outlive the transaction on our side
+        return {'poolclass': NullPool}
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': app.config['POSTGRES_POOL_SIZE'],
+        'max_overflow': app.config['POSTGRES_MAX_OVERFLOW'],
+        'pool_timeout': app.config['POSTGRES_POOL_TIMEOUT'],
+        'pool_recycle': app.config['POSTGRES_POOL_RECYCLE'],
+        'pool_pre_ping': app.config['POSTGRES_POOL_PRE_PING']
+    }
+
+
+def reset_engine_pool():
+    """ Drop connections inherited over fork, leaving the parent's ones open """
+    db.engine.dispose(close=False)
+
+
 def init_db(app: Flask):
 
     POSTGRES_HOST = app.config['POSTGRES_HOST']
@@ -14,5 +102,9 @@ def init_db(app: Flask):
 
     app.config['SQLALCHEMY_DATABASE_URI'] = \
         f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DATABASE}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app)
+
+    if app.config['POSTGRES_GEVENT'] and monkey.is_module_patched('socket'):
+        extensions.set_wait_callback(gevent_wait_callback)
 
     db.init_app(app)
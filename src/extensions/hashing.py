@@ -0,0 +1,186 @@
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+from argon2 import PasswordHasher as Argon2Hasher
+from argon2.exceptions import InvalidHash, VerificationError
+from extensions.metrics import PASSWORD_VERIFICATIONS
+from flask import Flask
+from gevent import monkey
+from gevent.threadpool import ThreadPool
+
+
+# Stored for users without a password (social logins), no scheme verifies it
+UNUSABLE_PASSWORD_PREFIX = '!'
+
+
+def make_unusable_password() -> str:
+    return UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(16)
+
+
+class HashingExecutor:
+    """ Runs CPU-bound password hashing off the gevent hub.
+
+    Modes:
+      inline  - hash in the calling greenlet, blocks the whole worker
+      thread  - hash in a pool of native threads (bcrypt releases the GIL)
+      process - hash in a pool of worker processes
+
+    The calling greenlet waits for the result cooperatively, so the worker
+    keeps serving other requests meanwhile.
+    """
+
+    MODES = ('inline', 'thread', 'process')
+
+    def __init__(self):
+        self.mode = 'inline'
+        self.size = 4
+        self._pool = None
+        self._pool_pid = None
+
+    def init_app(self, app: Flask):
+        mode = app.config['PASSWORD_HASHING_EXECUTOR']
+        if mode not in self.MODES:
+            raise ValueError(f'Unknown password hashing executor: {mode}')
+        self.mode = mode
+        self.size = app.config['PASSWORD_HASHING_POOL_SIZE']
+
+    def run(self, fn, *args):
+        if self.mode == 'inline':
+            return fn(*args)
+        pool = self._get_pool()
+        if isinstance(pool, ThreadPool):
+            return pool.apply(fn, args)
+        return pool.submit(fn, *args).result()
+
+    def _get_pool(self):
+        # Pools don't survive a fork, create them once per worker
+        if self._pool_pid != os.getpid():
+            self._pool = self._create_pool()
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def _create_pool(self):
+        if self.mode == 'process':
+            return ProcessPoolExecutor(max_workers=self.size)
+        # Under monkey-patching stdlib threads are greenlets, only gevent's
+        # pool runs native threads
+        if monkey.is_module_patched('threading'):
+            return ThreadPool(self.size)
+        return ThreadPoolExecutor(max_workers=self.size)
+
+
+class BcryptScheme:
+    name = 'bcrypt'
+
+    def __init__(self, rounds: int = 12):
+        self.rounds = rounds
+
+    def identify(self, pw_hash: str) -> bool:
+        return len(pw_hash) == 60 and pw_hash.startswith(('$2a$', '$2b$', '$2y$'))
+
+    def hash(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, pw_hash: str, password: str) -> bool:
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+        except ValueError:
+            return False
+
+    def needs_rehash(self, pw_hash: str) -> bool:
+        # $2b$<rounds>$<salt+hash>
+        return int(pw_hash.split('$')[2]) != self.rounds
+
+
+class Argon2Scheme:
+    name = 'argon2id'
+
+    def __init__(self, time_cost: int = 3, memory_cost: int = 65536, parallelism: int = 4):
+        self.hasher = Argon2Hasher(
+            time_cost=time_cost,
+            memory_cost=memory_cost,
+            parallelism=parallelism
+        )
+
+    def identify(self, pw_hash: str) -> bool:
+        return pw_hash.startswith('$argon2id$')
+
+    def hash(self, password: str) -> str:
+        return self.hasher.hash(password)
+
+    def verify(self, pw_hash: str, password: str) -> bool:
+        try:
+            return self.hasher.verify(pw_hash, password)
+        except (VerificationError, InvalidHash):
+            return False
+
+    def needs_rehash(self, pw_hash: str) -> bool:
+        return self.hasher.check_needs_rehash(pw_hash)
+
+
+class PasswordHasher:
+    """ Hashes new passwords with the configured scheme and verifies any known one.
+
+    A stored hash made by another scheme or with other cost parameters
+    needs a rehash, which AuthService does on the next successful login.
+    """
+
+    def __init__(self, executor: HashingExecutor):
+        self.executor = executor
+        self.schemes = {}
+        self.default = None
+
+    def init_app(self, app: Flask):
+        self.schemes = {
+            BcryptScheme.name: BcryptScheme(rounds=app.config['BCRYPT_LOG_ROUNDS']),
+            Argon2Scheme.name: Argon2Scheme(
+                time_cost=app.config['ARGON2_TIME_COST'],
+                memory_cost=app.config['ARGON2_MEMORY_COST'],
+                parallelism=app.config['ARGON2_PARALLELISM']
+            )
+        }
+        scheme = app.config['PASSWORD_HASH_SCHEME']
+        if scheme not in self.schemes:
+            raise ValueError(f'Unknown password hash scheme: {scheme}')
+        self.default = self.schemes[scheme]
+
+    def hash(self, password: str) -> str:
+        return self.executor.run(self.default.hash, password)
+
+    def verify(self, pw_hash: str, password: str) -> bool:
+        if pw_hash.startswith(UNUSABLE_PASSWORD_PREFIX):
+            PASSWORD_VERIFICATIONS.labels('unusable', 'mismatch').inc()
+            return False
+        scheme = self._identify(pw_hash)
+        if not scheme:
+            PASSWORD_VERIFICATIONS.labels('unknown', 'mismatch').inc()
+            return False
+        verified = self.executor.run(scheme.verify, pw_hash, password)
+        PASSWORD_VERIFICATIONS.labels(scheme.name, 'match' if verified else 'mismatch').inc()
+        return verified
+
+    def needs_rehash(self, pw_hash: str) -> bool:
+        scheme = self._identify(pw_hash)
+        return scheme is not self.default or scheme.needs_rehash(pw_hash)
+
+    def is_hash(self, value: str) -> bool:
+        """ Whether the value is a hash one of the known schemes can verify """
+        return self._identify(value) is not None
+
+    def _identify(self, pw_hash: str):
+        for scheme in self.schemes.values():
+            if scheme.identify(pw_hash):
+                return scheme
+        return None
+
+
+hashing_executor = HashingExecutor()
+password_hasher = PasswordHasher(hashing_executor)
+
+
+def init_hashing(app: Flask):
+    hashing_executor.init_app(app)
+    password_hasher.init_app(app)
@@ -0,0 +1,50 @@
+import time
+
+import requests
+from extensions.metrics import OAUTH_REQUEST_LATENCY
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class ProviderSession:
+    """ Keep-alive HTTP session to one OAuth provider.
+
+    Connections are pooled per host and reused across logins. Every request
+    has connect and read timeouts, so a slow provider can't hold a greenlet
+    for long. Only failed connects are retried: a request that reached the
+    provider may have used up the authorization code.
+    """
+
+    def __init__(self, provider: str, connect_timeout: float = 3.0, read_timeout: float = 10.0,
+                 retries: int = 2, pool_size: int = 10):
+        self.provider = provider
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, connect=retries, read=False, backoff_factor=0.1)
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, operation: str, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            OAUTH_REQUEST_LATENCY.labels(self.provider, operation, status) \
+                .observe(time.perf_counter() - started)
+
+    def fetch_json(self, operation: str, method: str, url: str, **kwargs) -> dict:
+        """ JSON body of a successful response, raises requests.RequestException or ValueError otherwise """
+        response = self.request(operation, method, url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self.session.close()
@@ -1,24 +1,143 @@
-from flask import Flask              
+from flask import Flask
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider        
 from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import (Decision, ParentBased, Sampler,
+                                              SamplingResult, TraceIdRatioBased)
+from opentelemetry.trace import SpanContext, StatusCode, TraceFlags
 
 
-def configure_tracer(app: Flask) -> None:
-    trace.set_tracer_provider(TracerProvider())
-    trace.get_tracer_provider().add_span_processor(
-        BatchSpanProcessor(
-            JaegerExporter(
-                agent_host_name=app.config.get('JAEGER_HOST', 'localhost'),
-                agent_port=app.config.get('JAEGER_PORT', 6831),
-            )
+class RouteRatioSampler(Sampler):
+    """ Trace-id ratio sampling with a separate ratio per Flask route.
+
+    With `record_unsampled` the spans that lose the draw are still recorded,
+    just not exported, so TailCaptureProcessor can keep the failed and slow
+    ones after the fact.
+    """
+
+    def __init__(self, ratio: float, route_ratios: dict = None, record_unsampled: bool = False):
+        self.default = TraceIdRatioBased(ratio)
+        self.routes = {route: TraceIdRatioBased(value) for route, value in (route_ratios or {}).items()}
+        self.record_unsampled = record_unsampled
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None):
+        # FlaskInstrumentor names server spans after the route rule
+        sampler = self.routes.get(name, self.default)
+        result = sampler.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+        if result.decision == Decision.DROP and self.record_unsampled:
+            return SamplingResult(Decision.RECORD_ONLY, result.attributes, result.trace_state)
+        return result
+
+    def get_description(self):
+        routes = ','.join(f'{route}={sampler.rate}' for route, sampler in self.routes.items())
+        return f'RouteRatioSampler{{{self.default.rate};{routes}}}'
+
+
+class TailCaptureProcessor(SpanProcessor):
+    """ Passes sampled spans on and promotes recorded-only ones that failed or ran slow """
+
+    def __init__(self, processor: SpanProcessor, slow_seconds: float):
+        self.processor = processor
+        self.slow_ns = int(slow_seconds * 1e9)
+        self.captured = 0
+
+    def on_start(self, span, parent_context=None):
+        self.processor.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan):
+        if not span.context.trace_flags.sampled:
+            if not self._worth_keeping(span):
+                return
+            span = self._as_sampled(span)
+            self.captured += 1
+        self.processor.on_end(span)
+
+    def shutdown(self):
+        self.processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000):
+        return self.processor.force_flush(timeout_millis)
+
+    def _worth_keeping(self, span: ReadableSpan) -> bool:
+        # Server spans get an error status on 5xx responses
+        return span.status.status_code == StatusCode.ERROR or \
+            span.end_time - span.start_time >= self.slow_ns
+
+    def _as_sampled(self, span: ReadableSpan) -> ReadableSpan:
+        context = span.context
+        return ReadableSpan(
+            name=span.name,
+            context=SpanContext(
+                context.trace_id,
+                context.span_id,
+                context.is_remote,
+                TraceFlags(TraceFlags.SAMPLED),
+                context.trace_state
+            ),
+            parent=span.parent,
+            resource=span.resource,
+            attributes=span.attributes,
+            events=span.events,
+            links=span.links,
+            kind=span.kind,
+            instrumentation_info=span.instrumentation_info,
+            status=span.status,
+            start_time=span.start_time,
+            end_time=span.end_time
+        )
+
+
+def create_exporter(name: str, app: Flask):
+    # Exporters import their transports, only pay for the configured ones
+    if name == 'jaeger':
+        from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+        return JaegerExporter(
+            agent_host_name=app.config['JAEGER_HOST'],
+            agent_port=app.config['JAEGER_PORT'],
+        )
+    if name == 'console':
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    raise ValueError(f'Unknown tracing exporter: {name}')
+
+
+def create_tracer_provider(config: dict, exporters: list) -> TracerProvider:
+    tail_capture = config['TRACING_TAIL_CAPTURE']
+    sampler = ParentBased(
+        root=RouteRatioSampler(
+            config['TRACING_SAMPLE_RATIO'],
+            config['TRACING_ROUTE_SAMPLE_RATIOS'],
+            record_unsampled=tail_capture and bool(exporters)
         )
     )
-    trace.get_tracer_provider().add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+    provider = TracerProvider(sampler=sampler)
+    for exporter in exporters:
+        processor = BatchSpanProcessor(
+            exporter,
+            max_queue_size=config['TRACING_MAX_QUEUE_SIZE'],
+            schedule_delay_millis=config['TRACING_SCHEDULE_DELAY_MS'],
+            max_export_batch_size=config['TRACING_MAX_EXPORT_BATCH_SIZE'],
+            export_timeout_millis=config['TRACING_EXPORT_TIMEOUT_MS']
+        )
+        if tail_capture:
+            processor = TailCaptureProcessor(processor, config['TRACING_SLOW_REQUEST_MS'] / 1000)
+        provider.add_span_processor(processor)
+    return provider
+
+
+def exporter_names(value: str) -> list:
+    """ Exporters listed in TRACING_EXPORTERS, 'none' or an empty value turn export off """
+    names = [name.strip().lower() for name in value.split(',') if name.strip()]
+    return [name for name in names if name != 'none']
+
+
+def configure_tracer(app: Flask) -> None:
+    """ Tracer provider and exporters, their export threads don't survive a fork """
+    exporters = [create_exporter(name, app) for name in exporter_names(app.config['TRACING_EXPORTERS'])]
+    trace.set_tracer_provider(create_tracer_provider(app.config, exporters))
 
 
 def init_jaeger(app: Flask):
-    configure_tracer(app)
+    # Spans go to the no-op provider until configure_tracer runs in the worker
     FlaskInstrumentor().instrument_app(app)
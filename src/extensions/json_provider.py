@@ -0,0 +1,60 @@
+import dataclasses
+import datetime
+
+import orjson
+from flask import Flask, current_app, jsonify
+from werkzeug.http import http_date
+
+
+def _default(obj):
+    # What Flask's JSONEncoder does for the types orjson leaves to us
+    if isinstance(obj, datetime.date):
+        return http_date(obj)
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class OrjsonProvider:
+    """ orjson-backed stand-in for `jsonify` on hot paths.
+
+    Flask 2.1 has no JSON provider hook, so call sites opt in through
+    `json_response`. The body is byte-for-byte what `jsonify` returns:
+    compact, keys sorted per JSON_SORT_KEYS, trailing newline. UUIDs are
+    serialized natively, dates as HTTP dates like Flask does. Non-ASCII
+    output (which Flask escapes) and pretty-printing in debug go through
+    `jsonify`. Floats may be formatted differently, keep them off this path.
+    """
+
+    OPTIONS = orjson.OPT_APPEND_NEWLINE | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def __init__(self):
+        self.enabled = True
+        self.options = self.OPTIONS | orjson.OPT_SORT_KEYS
+
+    def init_app(self, app: Flask):
+        self.enabled = app.config['JSON_PROVIDER'] == 'orjson'
+        self.options = self.OPTIONS
+        if app.config['JSON_SORT_KEYS']:
+            self.options |= orjson.OPT_SORT_KEYS
+
+    def response(self, obj):
+        app = current_app
+        if self.enabled and not (app.debug or app.config['JSONIFY_PRETTYPRINT_REGULAR']):
+            body = orjson.dumps(obj, default=_default, option=self.options)
+            if body.isascii():
+                return app.response_class(body, mimetype=app.config['JSONIFY_MIMETYPE'])
+        return jsonify(obj)
+
+
+json_provider = OrjsonProvider()
+
+
+def json_response(obj):
+    return json_provider.response(obj)
+
+
+def init_json_provider(app: Flask):
+    json_provider.init_app(app)
@@ -1,11 +1,122 @@
-from flask import Flask
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from http import HTTPStatus
+from ipaddress import ip_address, ip_network
+
+from flask import Flask, current_app, request
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
 from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+from jwt import PyJWTError
+
+
+def rate_limit_key() -> str:
+    """ JWT identity when the request carries a valid token, the client address otherwise """
+    key = request.environ.get('ratelimit.key')
+    if key is None:
+        key = request.environ['ratelimit.key'] = _identity_key() or f'ip:{client_address()}'
+    return key
+
+
+def client_address() -> str:
+    # Behind nginx every request comes from the proxy, the client is in X-Real-IP.
+    # Anyone can send the header, it is only believed from the trusted proxies
+    header = current_app.config['RATELIMIT_REAL_IP_HEADER']
+    if header and _trusted_proxy(request.remote_addr):
+        return request.headers.get(header) or request.remote_addr
+    return request.remote_addr
+
+
+@lru_cache(maxsize=8)
+def proxy_networks(value: str) -> tuple:
+    """ Networks of the comma-separated addresses and CIDRs in RATELIMIT_TRUSTED_PROXIES """
+    return tuple(ip_network(item.strip(), strict=False) for item in value.split(',') if item.strip())
+
+
+def _trusted_proxy(address: str) -> bool:
+    try:
+        address = ip_address(address)
+    except ValueError:
+        return False
+    networks = proxy_networks(current_app.config['RATELIMIT_TRUSTED_PROXIES'])
+    return any(address in network for network in networks)
+
+
+def _identity_key():
+    authorization = request.headers.get('Authorization', '')
+    if not authorization.startswith('Bearer '):
+        return None
+    try:
+        # Signature and expiry only, revocation is checked by the view
+        return f"user:{decode_token(authorization[7:])['sub']}"
+    except (JWTExtendedException, PyJWTError):
+        return None
+
+
+class LocalTokenBucket:
+    """ Per-worker token bucket per key, rejects floods before they reach Redis.
+
+    Set well above the shared limits it never decides for well-behaved
+    clients, it only saves the Redis round trip for the obvious floods.
+    """
+
+    def __init__(self, rate: float = 20, burst: int = 40, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets = OrderedDict()
+
+    def init_app(self, app: Flask):
+        self.rate = app.config['RATELIMIT_LOCAL_RATE']
+        self.burst = app.config['RATELIMIT_LOCAL_BURST']
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        # Least recently seen keys go first, a forgotten key starts with a full bucket
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        if not allowed:
+            self.rejected += 1
+        return allowed
+
+    def check_request(self):
+        if not self.rate or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        if self.allow(rate_limit_key()):
+            return None
+        return {'message': 'Too many requests.'}, HTTPStatus.TOO_MANY_REQUESTS, \
+            {'Retry-After': str(max(1, round(1 / self.rate)))}
+
+
+EXEMPT_ENDPOINTS = ('metrics', 'static')
 
 limiter = Limiter(
-    key_func=get_remote_address,
+    key_func=rate_limit_key,
     default_limits=["10 per second"]
 )
+local_bucket = LocalTokenBucket()
+
 
 def init_limiter(app: Flask):
+    if not app.config['RATELIMIT_STORAGE_URI']:
+        app.config['RATELIMIT_STORAGE_URI'] = \
+            f"redis://{app.config['REDIS_HOST']}:{app.config['REDIS_PORT']}/1"
+    app.config['RATELIMIT_STORAGE_OPTIONS'] = {
+        'socket_timeout': app.config['REDIS_SOCKET_TIMEOUT'],
+        'socket_connect_timeout': app.config['REDIS_CONNECT_TIMEOUT']
+    }
+
+    # A mistyped proxy list fails at startup rather than on the first request
+    proxy_networks(app.config['RATELIMIT_TRUSTED_PROXIES'])
+    local_bucket.init_app(app)
+    # Registered first so it runs before the limiter's own before_request
+    app.before_request(local_bucket.check_request)
     limiter.init_app(app)
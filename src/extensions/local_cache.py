@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Flask
+from redis import RedisError
+
+from extensions.cache import redis_db
+
+
+class LocalCache:
+    """ Bounded in-process LRU cache with per-entry TTL """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] < time.monotonic():
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class InvalidatedCache(LocalCache):
+    """ LocalCache whose entries are dropped in every worker through Redis pub/sub.
+
+    The cache is bypassed while the worker is not subscribed to the channel,
+    so an invalidation can't be missed.
+    """
+
+    CLEAR_ALL = '*'
+
+    def __init__(self, channel: str, **kwargs):
+        super().__init__(**kwargs)
+        self.channel = channel
+        self._subscriber = None
+        self._subscriber_pid = None
+        self._subscribe_lock = threading.Lock()
+
+    def get(self, key):
+        if not self._ensure_subscribed():
+            self.misses += 1
+            return None
+        return super().get(key)
+
+    def set(self, key, value):
+        if self._ensure_subscribed():
+            super().set(key, value)
+
+    def invalidate(self, key: str = None):
+        if key is None:
+            self.clear()
+        else:
+            self.delete(key)
+        try:
+            redis_db.publish(self.channel, key or self.CLEAR_ALL)
+        except RedisError:
+            # Subscribers lose the same Redis and clear themselves on the error
+            pass
+
+    def _ensure_subscribed(self):
+        # Subscriber thread doesn't survive a fork, start it once per worker
+        if self._subscriber_pid == os.getpid():
+            return True
+        with self._subscribe_lock:
+            if self._subscriber_pid == os.getpid():
+                return True
+            try:
+                pubsub = redis_db.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{self.channel: self._on_message})
+                self._subscriber = pubsub.run_in_thread(
+                    sleep_time=1,
+                    daemon=True,
+                    exception_handler=self._on_error
+                )
+            except Exception:
+                return False
+            # Entries cached before the subscription may already be stale
+            self.clear()
+            self._subscriber_pid = os.getpid()
+            return True
+
+    def _on_message(self, message):
+        key = message['data'].decode('utf-8')
+        if key == self.CLEAR_ALL:
+            self.clear()
+        else:
+            self.delete(key)
+
+    def _on_error(self, exc, pubsub, thread):
+        thread.stop()
+        pubsub.close()
+        self._subscriber_pid = None
+        self.clear()
+
+
+user_cache = InvalidatedCache('user-cache')
+
+
+def init_local_cache(app: Flask):
+    user_cache.maxsize = app.config['USER_CACHE_SIZE']
+    user_cache.ttl = app.config['USER_CACHE_TTL']
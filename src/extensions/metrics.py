@@ -0,0 +1,103 @@
+import os
+import time
+
+from extensions.limiter import limiter
+from flask import Flask, Response, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry,
+                               Counter, Gauge, Histogram, generate_latest,
+                               multiprocess)
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+# Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR,
+# /metrics sums them up whichever worker serves the scrape
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by endpoint and status.',
+    ['blueprint', 'endpoint', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+RATE_LIMITED = Counter(
+    'rate_limit_rejections_total',
+    'Requests rejected by the rate limiter.',
+    ['endpoint']
+)
+PASSWORD_VERIFICATIONS = Counter(
+    'password_verifications_total',
+    'Password hash verifications by scheme and outcome.',
+    ['scheme', 'result']
+)
+BLOCKLIST_CHECKS = Counter(
+    'token_blocklist_checks_total',
+    'Revocation checks by where they were answered: filter, redis or generation.',
+    ['source', 'revoked']
+)
+OAUTH_REQUEST_LATENCY = Histogram(
+    'oauth_provider_request_duration_seconds',
+    'Latency of requests to OAuth providers by operation and status.',
+    ['provider', 'operation', 'status'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+DB_POOL_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds',
+    'Time spent waiting for a free database connection.',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+DB_POOL_IN_USE = Gauge(
+    'db_pool_connections_in_use',
+    'Database connections checked out of the pool.',
+    multiprocess_mode='livesum'
+)
+
+
+# Labelled children by label values, labels() itself is slow on the hot path
+_latency_children = {}
+
+
+def metrics_view():
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def _start_timer():
+    request.environ['metrics.started'] = time.perf_counter()
+
+
+def _observe_request(response):
+    # Every access through the `request` proxy costs microseconds, resolve it once
+    req = request._get_current_object()
+    started = req.environ.pop('metrics.started', None)
+    # Unmatched URLs have no endpoint, keep them out of the label set
+    endpoint = req.endpoint or 'unknown'
+    if started is not None and endpoint != 'metrics':
+        key = (req.blueprint or '', endpoint, req.method, response.status_code)
+        histogram = _latency_children.get(key)
+        if histogram is None:
+            histogram = _latency_children[key] = REQUEST_LATENCY.labels(*key)
+        histogram.observe(time.perf_counter() - started)
+    if response.status_code == 429:
+        RATE_LIMITED.labels(endpoint).inc()
+    return response
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_IN_USE.inc()
+
+
+def _checkin(dbapi_connection, connection_record):
+    DB_POOL_IN_USE.dec()
+
+
+def init_metrics(app: Flask):
+    app.add_url_rule('/metrics', 'metrics', limiter.exempt(metrics_view))
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    if not event.contains(Pool, 'checkout', _checkout):
+        event.listen(Pool, 'checkout', _checkout)
+        event.listen(Pool, 'checkin', _checkin)
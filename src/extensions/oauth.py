@@ -1,15 +1,30 @@
+from extensions.http_client import ProviderSession
 from flask import Flask
 from services.social_auth_service import BaseOAuth
 
 
+_credentials = {}
+_http_options = {}
 _providers = {}
 
 def init_oauth(app: Flask):
-    for provider_cls in BaseOAuth.__subclasses__():
-        provider = provider_cls.name
-        creds = app.config['OAUTH_CREDENTIALS'][provider]
-        _providers[provider] = provider_cls(creds)
+    _credentials.update(app.config['OAUTH_CREDENTIALS'])
+    _http_options.update(
+        connect_timeout=app.config['OAUTH_CONNECT_TIMEOUT'],
+        read_timeout=app.config['OAUTH_READ_TIMEOUT'],
+        retries=app.config['OAUTH_RETRIES'],
+        pool_size=app.config['OAUTH_POOL_SIZE']
+    )
 
 
 def get_provider(provider: str) -> BaseOAuth:
+    # Providers are built on first use, most workers never see a social login.
+    # Each gets its own keep-alive session, created after the fork
+    if provider not in _providers:
+        for provider_cls in BaseOAuth.__subclasses__():
+            if provider_cls.name == provider:
+                _providers[provider] = provider_cls(
+                    _credentials[provider],
+                    ProviderSession(provider, **_http_options)
+                )
     return _providers.get(provider, None)
@@ -0,0 +1,88 @@
+import logging
+import time
+
+from flask import Flask, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+class RequestQueryStats:
+    def __init__(self):
+        self.statements = 0
+        self.time = 0.0
+        self.rows = 0
+
+
+class SQLProfiler:
+    """ Counts statements, DB time and rows of every request.
+
+    The counters go out as X-DB-* response headers in debug mode (or with
+    SQL_PROFILER_HEADERS), statements slower than SQL_SLOW_QUERY_MS are
+    logged together with the endpoint that ran them.
+    """
+
+    def __init__(self):
+        self.slow_query_seconds = 0.1
+        self._listening = False
+
+    def init_app(self, app: Flask):
+        self.slow_query_seconds = app.config['SQL_SLOW_QUERY_MS'] / 1000
+
+        # Listen on the Engine class, the engine itself is created lazily
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+
+        app.before_request(self._reset)
+        app.after_request(self._add_headers)
+
+    def current(self) -> RequestQueryStats:
+        if 'query_stats' not in g:
+            g.query_stats = RequestQueryStats()
+        return g.query_stats
+
+    def _reset(self):
+        # create_app keeps an app context pushed, so `g` outlives a request
+        g.query_stats = RequestQueryStats()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's execution context, so a statement that raises leaves nothing behind.
+        # Statements the dialect runs on its own while connecting have no context and aren't counted.
+        if context is not None:
+            context.query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is None or not has_request_context():
+            return
+        elapsed = time.perf_counter() - context.query_started
+
+        stats = self.current()
+        stats.statements += 1
+        stats.time += elapsed
+        stats.rows += max(cursor.rowcount, 0)
+
+        if elapsed >= self.slow_query_seconds:
+            logger.warning(
+                'Slow query on %s %s (%s): %.1f ms\n%s',
+                request.method, request.path, request.endpoint, elapsed * 1000, statement
+            )
+
+    def _add_headers(self, response):
+        # Debug is decided at request time, `app.run(debug=True)` sets it after init
+        if not (current_app.debug or current_app.config['SQL_PROFILER_HEADERS']):
+            return response
+        stats = self.current()
+        response.headers['X-DB-Statements'] = str(stats.statements)
+        response.headers['X-DB-Time-Ms'] = f'{stats.time * 1000:.1f}'
+        response.headers['X-DB-Rows'] = str(stats.rows)
+        return response
+
+
+sql_profiler = SQLProfiler()
+
+
+def init_sql_profiler(app: Flask):
+    sql_profiler.init_app(app)
@@ -0,0 +1,50 @@
+""" Gunicorn settings, picked up from the working directory.
+
+The app is built once in the master and forked into the workers, sharing
+its imported modules copy-on-write. Everything that must not cross a fork
+(database and Redis connections, tracer export threads) is set up again
+in post_fork.
+
+Prometheus samples of all workers are kept as files in
+PROMETHEUS_MULTIPROC_DIR, which has to be set before prometheus_client
+is imported and is emptied on every start.
+"""
+import os
+import shutil
+import time
+
+from gevent import monkey
+monkey.patch_all()
+
+CONFIG_LOADED = time.perf_counter()
+
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+os.makedirs(PROMETHEUS_MULTIPROC_DIR)
+
+bind = '0.0.0.0:8000'
+worker_class = 'gevent'
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+preload_app = True
+# Set in the master before the app is loaded, create_app leaves worker state to post_fork
+raw_env = ['APP_PRELOAD=1']
+
+
+def when_ready(server):
+    server.log.info('App loaded in %.1f ms', (time.perf_counter() - CONFIG_LOADED) * 1000)
+
+
+def post_fork(server, worker):
+    from app import init_worker
+    from wsgi_app import app
+
+    started = time.perf_counter()
+    with app.app_context():
+        init_worker(app)
+    worker.log.info('Worker %s initialized in %.1f ms', worker.pid, (time.perf_counter() - started) * 1000)
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of the dead worker, its counters keep counting
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
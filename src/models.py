@@ -67,37 +67,95 @@ class Role(Base):
         return f'<Role {self.name}>'
 
 
-def create_partition(target, connection, **kw) -> None:
-    """ creating partition by user_sign_in """
-    connection.execute(
-        """CREATE TABLE IF NOT EXISTS "user_sign_in_pc" PARTITION OF "users_sign_in" FOR VALUES IN ('pc')"""
-    )
-    connection.execute(
-        """CREATE TABLE IF NOT EXISTS "user_sign_in_tablet" PARTITION OF "users_sign_in" FOR VALUES IN ('tablet')"""
-    )
-    connection.execute(
-        """CREATE TABLE IF NOT EXISTS "user_sign_in_mobile" PARTITION OF "users_sign_in" FOR VALUES IN ('mobile')"""
-    )
+LOGIN_HISTORY_DEVICE_TYPES = ('pc', 'tablet', 'mobile', 'other')
+LOGIN_HISTORY_PARTITIONS_AHEAD = 3
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    """ First day of the month `months` after the month of the date """
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def month_partition_name(device_type: str, month: datetime.date) -> str:
+    return f'login_history_{device_type}_y{month.year}m{month.month:02}'
+
+
+def create_month_partition(connection, device_type: str, month: datetime.date) -> str:
+    """ creating a monthly partition, moving its rows out of the default partition first """
+    name = month_partition_name(device_type, month)
+    parent = f'login_history_{device_type}'
+    bounds = f"""FROM ('{month}') TO ('{add_months(month, 1)}')"""
+    in_month = f"""auth_datetime >= '{month}' AND auth_datetime < '{add_months(month, 1)}'"""
+
+    if connection.execute(f"""SELECT to_regclass('"{name}"')""").scalar() is not None:
+        return name
+    # Writers wait until the month's rows are moved and the partition is attached
+    connection.execute(f'LOCK TABLE "{parent}_default" IN EXCLUSIVE MODE')
+    if not connection.execute(f'SELECT EXISTS (SELECT 1 FROM "{parent}_default" WHERE {in_month})').scalar():
+        connection.execute(f'CREATE TABLE "{name}" PARTITION OF "{parent}" FOR VALUES {bounds}')
+        return name
+
+    # A partition can't be created while the default partition holds rows of its range
+    connection.execute(f'CREATE TABLE "{name}" (LIKE "{parent}" INCLUDING DEFAULTS)')
     connection.execute(
-        """CREATE TABLE IF NOT EXISTS "user_sign_in_other" PARTITION OF "users_sign_in" FOR VALUES IN ('other')"""
+        f'WITH moved AS (DELETE FROM "{parent}_default" WHERE {in_month} RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved'
     )
+    connection.execute(f'ALTER TABLE "{parent}" ATTACH PARTITION "{name}" FOR VALUES {bounds}')
+    return name
+
+
+def create_month_partitions(connection, first_month: datetime.date, last_month: datetime.date) -> list:
+    """ creating monthly auth_datetime partitions under every device partition """
+    created = []
+    month = add_months(first_month, 0)
+    while month <= last_month:
+        for device_type in LOGIN_HISTORY_DEVICE_TYPES:
+            created.append(create_month_partition(connection, device_type, month))
+        month = add_months(month, 1)
+    return created
+
+
+def create_partition(target, connection, **kw) -> None:
+    """ creating partition by user_device_type, each one sub-partitioned by month of auth_datetime """
+    for device_type in LOGIN_HISTORY_DEVICE_TYPES:
+        connection.execute(
+            f"""CREATE TABLE IF NOT EXISTS "login_history_{device_type}" PARTITION OF "login_history" """
+            f"""FOR VALUES IN ('{device_type}') PARTITION BY RANGE (auth_datetime)"""
+        )
+        # Catches rows no monthly partition was created for yet
+        connection.execute(
+            f"""CREATE TABLE IF NOT EXISTS "login_history_{device_type}_default" """
+            f"""PARTITION OF "login_history_{device_type}" DEFAULT"""
+        )
+    today = datetime.date.today()
+    create_month_partitions(connection, today, add_months(today, LOGIN_HISTORY_PARTITIONS_AHEAD))
 
 
 class LoginHistory(Base):
     __tablename__ = 'login_history'
     __table_args__ = (
-        UniqueConstraint('id', 'user_device_type'),
         {
             'postgresql_partition_by': 'LIST (user_device_type)',
             'listeners': [('after_create', create_partition)],
-        }
+        },
     )
 
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    # Unique keys of a partitioned table must include every partition key
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('user.id'), index=True)
     user_agent = db.Column(db.String)
-    auth_datetime = db.Column(db.DateTime(), default=datetime.datetime.now)
+    auth_datetime = db.Column(db.DateTime(), primary_key=True, default=datetime.datetime.now)
     user_device_type = db.Column(db.Text, primary_key=True)
 
     def __repr__(self):
         return f'<Login {self.user_id}: {self.auth_datetime}>'
+
+
+db.Index(
+    'ix_login_history_user_id_auth_datetime',
+    LoginHistory.user_id,
+    LoginHistory.auth_datetime.desc(),
+    LoginHistory.id.desc()
+)
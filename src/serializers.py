@@ -0,0 +1,56 @@
+from marshmallow import Schema, fields
+
+from schemas import login_history_schema, role_schema, user_roles
+
+MISSING = object()
+
+
+def _compile_field(field: fields.Field):
+    """ Plain function doing what the field's serialize does for a non-None value """
+    if isinstance(field, fields.Nested):
+        nested = compile_schema(field.schema)
+        if field.many:
+            return lambda value: [nested(item) for item in value]
+        return nested
+    if isinstance(field, fields.DateTime) and field.format in (None, 'iso'):
+        return lambda value: value.isoformat()
+    # Email and UUID are Strings too
+    if isinstance(field, fields.String):
+        return str
+    raise TypeError(f'No compiled serializer for {type(field).__name__}')
+
+
+def compile_schema(schema: Schema):
+    """ Dump function equivalent to `schema.dump(obj)` without marshmallow's per-field dispatch.
+
+    Only the field types used by the hot-path schemas are supported, anything
+    else raises TypeError when compiling. Objects and dicts are read the way
+    marshmallow reads them, an absent key or attribute is left out.
+    """
+    converters = [
+        (name, field.data_key or name, _compile_field(field))
+        for name, field in schema.dump_fields.items()
+    ]
+
+    def dump(obj) -> dict:
+        if isinstance(obj, dict):
+            get = obj.get
+        else:
+            get = lambda key, default: getattr(obj, key, default)  # noqa: E731
+        result = {}
+        for attribute, key, convert in converters:
+            value = get(attribute, MISSING)
+            if value is not MISSING:
+                result[key] = None if value is None else convert(value)
+        return result
+
+    return dump
+
+
+def compile_many(dump):
+    return lambda objs: [dump(obj) for obj in objs]
+
+
+dump_login_history = compile_many(compile_schema(login_history_schema))
+dump_roles = compile_many(compile_schema(role_schema))
+dump_user_roles = compile_schema(user_roles)
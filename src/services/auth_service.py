@@ -1,19 +1,31 @@
+import base64
 import datetime
+import uuid
+from collections import namedtuple
 from http import HTTPStatus
 
-from extensions.bcrypt import bcrypt
-from extensions.cache import redis_db
+from extensions.blocklist import token_blocklist
 from extensions.db import db
+from extensions.hashing import password_hasher
+from extensions.json_provider import json_response
+from extensions.local_cache import user_cache
 from extensions.ma import ma
-from flask import jsonify
+from flask import current_app
 from flask_jwt_extended import create_access_token, create_refresh_token
 from marshmallow import ValidationError
 from models import LoginHistory, User
-from schemas import (login_history_schema, user_change_password_schema,
-                     user_schema_register)
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from schemas import user_change_password_schema, user_schema_register
+from serializers import dump_login_history, dump_roles
 
+from services.login_history_stream import login_history_stream
+from services.registered_emails import may_be_registered, remember_registered
+from services.roles_version import get_roles_version
 from services.utils import get_device_type
 
+CachedUser = namedtuple('CachedUser', ['id', 'email', 'roles'])
+
 
 class AuthService:
     
@@ -23,7 +35,9 @@ class AuthService:
         'NOT_EXIST': 'User {0} does not exist.',
         'WRONG_PASSWORD': 'Wrong password.',
         'TOKEN_REVOKED': '{0} token successfully revoked.',
-        'PASSWORD_CHANGED': 'Password successfully changed.'
+        'ALL_TOKENS_REVOKED': 'All tokens of {0} successfully revoked.',
+        'PASSWORD_CHANGED': 'Password successfully changed.',
+        'WRONG_CURSOR': 'Wrong cursor.'
     }
 
     ACCESS_EXPIRATION = {
@@ -36,13 +50,18 @@ class AuthService:
         if err:
             return err, HTTPStatus.BAD_REQUEST
 
-        exists = self._check_user_exists(user_data['email'])
-        if exists:
-            message = self._get_response('ALREADY_EXISTS', user_data['email'])
+        email = user_data['email']
+        # Known duplicates are turned away before spending a hash on them
+        if may_be_registered(email) and self._check_user_exists(email):
+            message = self._get_response('ALREADY_EXISTS', email)
             return message, HTTPStatus.BAD_REQUEST
-        
+
         user_data['password'] = self._generate_password_hash(user_data['password'])
-        self._save_user(user_data)
+        created = self._save_user(user_data)
+        remember_registered(email)
+        if not created:
+            message = self._get_response('ALREADY_EXISTS', email)
+            return message, HTTPStatus.BAD_REQUEST
 
         message = self._get_response('SUCCESS')
         return message, HTTPStatus.CREATED
@@ -56,29 +75,98 @@ class AuthService:
         if not self._check_user_password(user, user_data):
             message = self._get_response('WRONG_PASSWORD')
             return message, HTTPStatus.UNAUTHORIZED
+
+        if password_hasher.needs_rehash(user.password):
+            self._set_user_new_password(user, user_data['password'])
         
         self._create_login_history_record(user, user_data['user_agent'])
-        return self._create_tokens(user.email), HTTPStatus.OK
+        return self.create_tokens(user.email, user), HTTPStatus.OK
     
     def refresh_token(self, identity: str):
-        return self._create_tokens(identity), HTTPStatus.OK
+        return self.create_tokens(identity), HTTPStatus.OK
 
-    def revoke_token(self, jti: str, token_type: str):
-        redis_db.set(jti, '', self.ACCESS_EXPIRATION[token_type])
+    def get_token_roles(self, token: dict):
+        """ Roles embedded in the access token, None if they can't be trusted anymore """
+        if not current_app.config['JWT_STATELESS_CHECK_AUTH']:
+            return None
+        if 'roles' not in token or 'roles_version' not in token:
+            return None
+        if token['roles_version'] != get_roles_version(token['sub']):
+            return None
+        return token['roles']
+
+    def revoke_token(self, token: dict):
+        token_type = token['type']
+        tokens = {token['jti']: self.ACCESS_EXPIRATION[token_type]}
+        # An access token knows its refresh token, logout revokes the pair
+        if 'refresh_jti' in token:
+            tokens[token['refresh_jti']] = self.ACCESS_EXPIRATION['refresh']
+        token_blocklist.revoke(tokens)
         message = self._get_response('TOKEN_REVOKED', token_type)
         return message
 
+    def revoke_all_tokens(self, identity: str):
+        token_blocklist.revoke_all(identity)
+        message = self._get_response('ALL_TOKENS_REVOKED', identity)
+        return message
+
     def get_login_history(
         self,
         identity: str,
         page: int = None,
-        per_page: int = None
+        per_page: int = None,
+        cursor: str = None
     ):
+        """ Page of the history, by page number or after an opaque keyset cursor
+
+        The cursor mode answers {'items': [...], 'next_cursor': ...} and costs
+        the same on any page, the page mode keeps the old plain list.
+        """
         user = self._check_user_exists(identity)
         query = LoginHistory.query.filter(LoginHistory.user_id == user.id) \
-            .order_by(LoginHistory.auth_datetime.desc()) \
-            .paginate(page, per_page, error_out=False).items
-        return jsonify(login_history_schema.dump(query, many=True))
+            .order_by(LoginHistory.auth_datetime.desc(), LoginHistory.id.desc())
+
+        if cursor is None:
+            # Same as paginate(error_out=False) used to do with a negative size
+            per_page = 20 if per_page < 0 else per_page
+            records = query.limit(per_page).offset((max(page, 1) - 1) * per_page).all()
+            return json_response(dump_login_history(records))
+
+        if cursor:
+            try:
+                auth_datetime, record_id = self._decode_cursor(cursor)
+            except ValueError:
+                return self._get_response('WRONG_CURSOR'), HTTPStatus.BAD_REQUEST
+            query = query.filter(
+                tuple_(LoginHistory.auth_datetime, LoginHistory.id) < tuple_(auth_datetime, record_id)
+            )
+
+        records = query.limit(per_page + 1).all()
+        next_cursor = None
+        if len(records) > per_page:
+            records = records[:per_page]
+            next_cursor = self._encode_cursor(records[-1])
+        return json_response({
+            'items': dump_login_history(records),
+            'next_cursor': next_cursor
+        })
+
+    def get_cached_user(self, email: str):
+        """ User id and roles, served from the per-worker cache when possible """
+        user = user_cache.get(email)
+        if user is not None:
+            return user
+
+        user = self._check_user_exists(email)
+        if not user:
+            return None
+        user = CachedUser(
+            id=user.id,
+            email=user.email,
+            roles=tuple(dump_roles(user.roles))
+        )
+        user_cache.set(email, user)
+        return user
 
     def change_password(self, user_data: dict):
         user_data, err = self._validate_user_data(user_data, user_change_password_schema)
@@ -112,20 +200,29 @@ class AuthService:
         else:
             return data, {}
 
-    def _save_user(self, user_data: dict):
-        email = user_data['email']
-        password = user_data['password']
-
-        user = User(email=email, password=password)
-
-        db.session.add(user)
+    def _save_user(self, user_data: dict) -> bool:
+        """ Insert the user unless the email is taken, duplicates are told apart by the insert itself """
+        statement = insert(User.__table__) \
+            .values(email=user_data['email'], password=user_data['password']) \
+            .on_conflict_do_nothing(index_elements=['email']) \
+            .returning(User.id)
+        user_id = db.session.execute(statement).scalar()
         db.session.commit()
+        if user_id is None:
+            return False
+        # Workers may still hold a removed user of the same email
+        user_cache.invalidate(user_data['email'])
+        return True
 
     def _update_user(self, user: User, **kwargs):
-        user.query.update(kwargs)
+        User.query.filter(User.id == user.id).update(kwargs)
         db.session.commit()
 
     def _create_login_history_record(self, user: User, user_agent: str):
+        if current_app.config['LOGIN_HISTORY_ASYNC']:
+            login_history_stream.push(user.id, user_agent, get_device_type(user_agent))
+            return
+
         record = LoginHistory(
             user_id=user.id,
             user_agent=user_agent,
@@ -135,16 +232,45 @@ class AuthService:
         db.session.commit()
 
     def _check_user_password(self, user: User, user_data: dict):
-        return bcrypt.check_password_hash(user.password, user_data['password'])
+        return password_hasher.verify(user.password, user_data['password'])
     
     def _generate_password_hash(self, password: str):
-        password = bcrypt.generate_password_hash(password)
-        return password.decode('utf-8')
+        return password_hasher.hash(password)
+
+    def create_tokens(self, identity: str, user: User = None):
+        generation = token_blocklist.generation(identity)
+        refresh_jti = str(uuid.uuid4())
+        refresh_token = create_refresh_token(
+            identity=identity,
+            additional_claims={'jti': refresh_jti, 'gen': generation}
+        )
+        claims = self._create_role_claims(identity, user)
+        claims.update(refresh_jti=refresh_jti, gen=generation)
+        access_token = create_access_token(identity=identity, additional_claims=claims)
+        return json_response({'access_token': access_token, 'refresh_token': refresh_token})
+
+    def _create_role_claims(self, identity: str, user: User = None):
+        if not current_app.config['JWT_STATELESS_CHECK_AUTH']:
+            return {}
+
+        # Read the stamp before the roles so a concurrent change invalidates the token
+        roles_version = get_roles_version(identity)
+        user = user or self._check_user_exists(identity)
+        if not user:
+            return {}
+        return {
+            'roles': dump_roles(user.roles),
+            'roles_version': roles_version
+        }
+
+    def _encode_cursor(self, record: LoginHistory):
+        value = f'{record.auth_datetime.isoformat()}|{record.id}'
+        return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii')
 
-    def _create_tokens(self, identity: str):
-        access_token = create_access_token(identity=identity)
-        refresh_token = create_refresh_token(identity=identity)
-        return jsonify(access_token=access_token, refresh_token=refresh_token)
+    def _decode_cursor(self, cursor: str):
+        value = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        auth_datetime, record_id = value.split('|')
+        return datetime.datetime.fromisoformat(auth_datetime), uuid.UUID(record_id)
 
     def _get_response(self, message_key: str, *args):
         return {
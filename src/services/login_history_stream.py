@@ -0,0 +1,115 @@
+import datetime
+import uuid
+
+import redis
+from extensions.cache import redis_db
+from flask import current_app
+
+
+class LoginHistoryStream:
+    """ Redis stream of login events written to login_history in batches """
+
+    STREAM_KEY = 'login_history'
+    DEAD_LETTER_KEY = 'login_history:dead-letter'
+    GROUP = 'login-history-writers'
+    LAG_SCAN_LIMIT = 10000
+
+    def push(self, user_id: uuid.UUID, user_agent: str, user_device_type: str):
+        # The id makes a redelivered event a no-op on insert
+        event = {
+            'id': str(uuid.uuid4()),
+            'user_id': str(user_id),
+            'user_agent': user_agent,
+            'user_device_type': user_device_type,
+            'auth_datetime': datetime.datetime.now().isoformat()
+        }
+        redis_db.xadd(
+            self.STREAM_KEY,
+            event,
+            maxlen=current_app.config['LOGIN_HISTORY_STREAM_MAXLEN']
+        )
+
+    def create_group(self):
+        try:
+            redis_db.xgroup_create(self.STREAM_KEY, self.GROUP, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read(self, consumer: str, count: int, block_ms: int):
+        """ Events never delivered to the group, waiting up to `block_ms` for them """
+        response = redis_db.xreadgroup(self.GROUP, consumer, {self.STREAM_KEY: '>'}, count=count, block=block_ms)
+        return self._decode_entries(response[0][1] if response else [])
+
+    def read_pending(self, consumer: str, count: int):
+        """ Batches of the events delivered to the consumer but never acked, oldest first """
+        last_id = '0'
+        while True:
+            response = redis_db.xreadgroup(self.GROUP, consumer, {self.STREAM_KEY: last_id}, count=count)
+            entries = response[0][1] if response else []
+            if not entries:
+                return
+            # Reading on after the batch, its events may be dead-lettered rather than returned
+            last_id = entries[-1][0]
+            yield self._decode_entries(entries)
+
+    def _decode_entries(self, entries: list):
+        events = []
+        for entry_id, fields in entries:
+            if not fields:
+                # Trimmed off the stream while pending, nothing left to write
+                self.ack([entry_id])
+                continue
+            try:
+                events.append((entry_id, self._decode(fields)))
+            except (KeyError, ValueError) as e:
+                self.dead_letter(entry_id, fields, f'Malformed event: {e!r}')
+        return events
+
+    def ack(self, entry_ids: list):
+        if entry_ids:
+            redis_db.xack(self.STREAM_KEY, self.GROUP, *entry_ids)
+
+    def dead_letter(self, entry_id: bytes, event: dict, error: str):
+        """ Move an event that can't be written out of the way of the ones after it """
+        fields = {key: value if isinstance(value, bytes) else str(value) for key, value in event.items()}
+        fields.update(entry_id=entry_id, error=error)
+        redis_db.xadd(
+            self.DEAD_LETTER_KEY,
+            fields,
+            maxlen=current_app.config['LOGIN_HISTORY_STREAM_MAXLEN']
+        )
+        self.ack([entry_id])
+
+    def lag(self):
+        """ Events the group has yet to write: delivered but unacked, and never delivered """
+        group = next(
+            group for group in redis_db.xinfo_groups(self.STREAM_KEY)
+            if group['name'].decode('utf-8') == self.GROUP
+        )
+        undelivered = group.get('lag')
+        if undelivered is None:
+            # Redis before 7 doesn't track the lag, count the entries after the
+            # last delivered one, up to LAG_SCAN_LIMIT
+            last_delivered = group['last-delivered-id'].decode('utf-8')
+            undelivered = len(redis_db.xrange(
+                self.STREAM_KEY, min=f'({last_delivered}', count=self.LAG_SCAN_LIMIT
+            ))
+        return {
+            'pending': group['pending'],
+            'undelivered': undelivered,
+            'stream_length': redis_db.xlen(self.STREAM_KEY)
+        }
+
+    def _decode(self, fields: dict):
+        event = {key.decode('utf-8'): value.decode('utf-8') for key, value in fields.items()}
+        return {
+            'id': uuid.UUID(event['id']),
+            'user_id': uuid.UUID(event['user_id']),
+            'user_agent': event['user_agent'],
+            'user_device_type': event['user_device_type'],
+            'auth_datetime': datetime.datetime.fromisoformat(event['auth_datetime'])
+        }
+
+
+login_history_stream = LoginHistoryStream()
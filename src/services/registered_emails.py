@@ -0,0 +1,29 @@
+from extensions.cache import redis_db
+from flask import current_app
+from redis import RedisError
+
+REGISTERED_EMAILS_KEY = 'registered_emails'
+
+
+def may_be_registered(email: str) -> bool:
+    """ Whether the email was registered before, as far as the pre-check knows.
+
+    A hit still has to be confirmed by the database: users may be removed
+    behind the set's back. Off or unavailable, the pre-check says no and the
+    insert finds the duplicates.
+    """
+    if not current_app.config['REGISTRATION_PRECHECK']:
+        return False
+    try:
+        return bool(redis_db.sismember(REGISTERED_EMAILS_KEY, email))
+    except RedisError:
+        return False
+
+
+def remember_registered(email: str):
+    if not current_app.config['REGISTRATION_PRECHECK']:
+        return
+    try:
+        redis_db.sadd(REGISTERED_EMAILS_KEY, email)
+    except RedisError:
+        pass
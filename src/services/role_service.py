@@ -1,12 +1,22 @@
+import itertools
+import uuid
 from http import HTTPStatus
+from typing import Iterable
 
 from extensions.db import db
-from flask import jsonify
+from extensions.json_provider import json_response
+from extensions.local_cache import user_cache
+from flask import current_app
 from marshmallow import ValidationError
-from models import Role, User
+from models import Role, User, roles_users
 from schemas import role_schema
+from serializers import dump_roles
+from sqlalchemy import and_, any_, cast, exists, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
 from sqlalchemy.exc import IntegrityError
 
+from services.roles_version import bump_roles_version
+
 
 class RoleService:
 
@@ -17,11 +27,12 @@ class RoleService:
         'ROLE_NOT_EXISTS': 'Role {0} does not exist.',
         'USER_NOT_EXISTS': 'User {0} does not exist.',
         'ROLE_ASSIGNED': 'Role {0} assigned to user {1}.',
-        'ROLE_UNASSIGNED': 'Role {0} unassigned from user {1}.'
+        'ROLE_UNASSIGNED': 'Role {0} unassigned from user {1}.',
+        'WRONG_USERS': 'Expected a list of user ids.'
     }
 
     def get_roles(self):
-        return jsonify(role_schema.dump(Role.query.all(), many=True))
+        return json_response(dump_roles(Role.query.all()))
 
     def create_role(self, role_data):
         role_data, err = self._validate_data(role_data, role_schema)
@@ -78,6 +89,30 @@ class RoleService:
             return err, HTTPStatus.BAD_REQUEST
         return self._get_response('ROLE_UNASSIGNED', role.name, user.id)
 
+    def assign_role_bulk(self, role_name: str, user_ids: Iterable):
+        """ Assign the role to every existing user of the ids, one transaction per chunk """
+        return self._apply_role_bulk(role_name, user_ids, self._assign_role_chunk)
+
+    def unassign_role_bulk(self, role_name: str, user_ids: Iterable):
+        """ Take the role away from every user of the ids, one transaction per chunk """
+        return self._apply_role_bulk(role_name, user_ids, self._unassign_role_chunk)
+
+    def user_has_role(self, email: str, *role_names: str) -> bool:
+        """ Whether the user holds any of the roles, in at most one EXISTS query """
+        user = user_cache.get(email)
+        if user is not None:
+            return any(role['name'] in role_names for role in user.roles)
+
+        query = exists().where(
+            and_(
+                User.email == email,
+                roles_users.c.user_id == User.id,
+                roles_users.c.role_id == Role.id,
+                Role.name.in_(role_names)
+            )
+        )
+        return db.session.query(query).scalar()
+
     def _assign_user_role(self, user: User, role: Role):
         try:
             user.roles.append(role)
@@ -85,6 +120,7 @@ class RoleService:
         except IntegrityError:
             db.session.rollback()
             return {'message': f'{user.id} already has role {role.name}'}
+        self._invalidate_user_roles(user.email)
 
     def _unassign_user_role(self, user: User, role: Role):
         try:
@@ -93,6 +129,75 @@ class RoleService:
         except ValueError as e:
             db.session.rollback()
             return {'message': f'{user.id} does not have role {role.name}'}
+        self._invalidate_user_roles(user.email)
+
+    def _apply_role_bulk(self, role_name: str, user_ids: Iterable, apply_chunk):
+        role, err = self._validate_role(role_name)
+        if not role:
+            return err, HTTPStatus.BAD_REQUEST
+
+        chunk_size = current_app.config['ROLE_BULK_CHUNK_SIZE']
+        user_ids = iter(user_ids)
+        chunks = []
+        try:
+            while True:
+                chunk = list(itertools.islice(user_ids, chunk_size))
+                if not chunk:
+                    break
+                valid_ids = self._parse_user_ids(chunk)
+                changed = apply_chunk(role, valid_ids) if valid_ids else 0
+                db.session.commit()
+                chunks.append({
+                    'received': len(chunk),
+                    'invalid': len(chunk) - len(valid_ids),
+                    'changed': changed
+                })
+        except ValueError:
+            # Malformed input, chunks committed so far stay applied
+            db.session.rollback()
+            message = self._get_response('WRONG_USERS')
+            message['chunks'] = chunks
+            return message, HTTPStatus.BAD_REQUEST
+        finally:
+            # Bumping every user's stamp is cheaper than one per affected user
+            if chunks:
+                self._invalidate_user_roles()
+
+        return {
+            'role': role.name,
+            'changed': sum(chunk['changed'] for chunk in chunks),
+            'chunks': chunks
+        }
+
+    def _parse_user_ids(self, chunk: list) -> list:
+        valid_ids = []
+        for user_id in chunk:
+            try:
+                valid_ids.append(str(uuid.UUID(user_id)))
+            except (TypeError, AttributeError, ValueError):
+                continue
+        return valid_ids
+
+    def _assign_role_chunk(self, role: Role, user_ids: list) -> int:
+        # Unknown ids drop out of the SELECT, existing pairs out of the INSERT
+        query = insert(roles_users).from_select(
+            ['user_id', 'role_id'],
+            select(User.id, cast(literal(str(role.id)), UUID(as_uuid=True))).where(
+                User.id == any_(self._uuid_array(user_ids))
+            )
+        ).on_conflict_do_nothing()
+        return db.session.execute(query).rowcount
+
+    def _unassign_role_chunk(self, role: Role, user_ids: list) -> int:
+        query = roles_users.delete().where(
+            roles_users.c.role_id == role.id,
+            roles_users.c.user_id == any_(self._uuid_array(user_ids))
+        )
+        return db.session.execute(query).rowcount
+
+    def _uuid_array(self, user_ids: list):
+        # One array parameter instead of a placeholder per id
+        return cast(literal(user_ids, ARRAY(db.String)), ARRAY(UUID(as_uuid=True)))
 
     def _validate_user(self, user_uuid):
         user = self._check_user_exists(user_uuid)
@@ -134,6 +239,11 @@ class RoleService:
     def _delete_role(self, role):
         Role.query.filter(Role.name == role.name).delete()
         db.session.commit()
+        self._invalidate_user_roles()
+
+    def _invalidate_user_roles(self, email: str = None):
+        bump_roles_version(email)
+        user_cache.invalidate(email)
 
     def _get_response(self, label, *args):
         return {'message': self.RESPONSE_DESCRIPTIONS[label].format(*args)}
@@ -0,0 +1,21 @@
+from extensions.cache import redis_db
+
+GLOBAL_ROLES_VERSION_KEY = 'roles_version'
+USER_ROLES_VERSION_KEY = 'roles_version:{0}'
+
+
+def get_roles_version(identity: str) -> str:
+    """ Role-version stamp of a user, changes whenever their roles may have changed """
+    global_version, user_version = redis_db.get_many(
+        GLOBAL_ROLES_VERSION_KEY,
+        USER_ROLES_VERSION_KEY.format(identity)
+    )
+    return f'{int(global_version or 0)}.{int(user_version or 0)}'
+
+
+def bump_roles_version(identity: str = None):
+    """ Invalidate role claims of one user or, without identity, of every user """
+    if identity is None:
+        redis_db.incr(GLOBAL_ROLES_VERSION_KEY)
+    else:
+        redis_db.incr(USER_ROLES_VERSION_KEY.format(identity))
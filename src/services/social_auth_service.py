@@ -1,18 +1,38 @@
 import abc
-import json
+import datetime
+import uuid
+from http import HTTPStatus
+from urllib.parse import urljoin
 
-from extensions.bcrypt import bcrypt
+from config import OAuthProvider
+from extensions.cache import redis_db
 from extensions.db import db
-from flask import jsonify, redirect, url_for
-from flask_jwt_extended import create_access_token, create_refresh_token
+from extensions.hashing import make_unusable_password
+from extensions.http_client import ProviderSession
+from extensions.local_cache import user_cache
+from flask import current_app, redirect, url_for
 from models import SocialAccount, User
 from rauth import OAuth2Service
-from sqlalchemy import and_
+from redis import RedisError
+from requests import RequestException
+from sqlalchemy import cast, literal, select
+from sqlalchemy.dialects.postgresql import UUID, insert
 
-from services.utils import generate_random_email, generate_random_string
+from services.auth_service import auth_service
+from services.utils import generate_random_email
+
+# (provider, social id) -> email of the linked user. Links are never removed,
+# a user deleted meanwhile keeps logging in until SOCIAL_ACCOUNT_CACHE_TTL runs out
+SOCIAL_ACCOUNT_KEY = 'social_account_email:{0}:{1}'
 
 
 class BaseOAuth(abc.ABC):
+    def __init__(self, credentials: OAuthProvider, http: ProviderSession):
+        self.credentials = credentials
+        # rauth only builds the authorize URL, requests go through the pooled session
+        self.service = OAuth2Service(**credentials.dict(exclude={'provider'}))
+        self.http = http
+
     def auth(self):
         return redirect(
             self.service.get_authorize_url(
@@ -21,39 +41,92 @@ class BaseOAuth(abc.ABC):
             )
         )
 
-    def _create_user(self, email):
-        password = generate_random_string()
-        password_hash = bcrypt.generate_password_hash(password)
-        user = User(email=email, password=password_hash)
-        db.session.add(user)
+    def _login(self, social_id: str, email: str):
+        identity = self._link_social_account(social_id, email)
+        if identity is None:
+            return {'message': 'User with this email already exists.'}, HTTPStatus.CONFLICT
+        # Same claims as a password login, so logout and logout-all apply to these tokens too
+        return auth_service.create_tokens(identity)
+
+    def _link_social_account(self, social_id: str, email: str):
+        """ Identity of the user linked to the social account, linking a new user on first login.
+
+        Repeat logins are answered from Redis. A first login inserts the
+        user and the link in one statement; the email is only used then.
+        None when the email belongs to a user registered otherwise: whoever
+        controls the social account doesn't get their account.
+        """
+        key = SOCIAL_ACCOUNT_KEY.format(self.name, social_id)
+        try:
+            cached = redis_db.get(key)
+        except RedisError:
+            cached = None
+        if cached is not None:
+            return cached.decode('utf-8')
+
+        identity = self._get_linked_user(social_id)
+        created = False
+        if identity is None:
+            identity = self._insert_social_account(social_id, email)
+            created = identity is not None
+        if identity is None:
+            # A concurrent first login linked the account before us, or the email is taken
+            db.session.rollback()
+            identity = self._get_linked_user(social_id)
+            if identity is None:
+                return None
         db.session.commit()
-        return user
+        if created:
+            user_cache.invalidate(identity)
+
+        try:
+            redis_db.set(key, identity, ex=current_app.config['SOCIAL_ACCOUNT_CACHE_TTL'])
+        except RedisError:
+            pass
+        return identity
+
+    def _get_linked_user(self, social_id: str):
+        return db.session.execute(
+            select(User.email)
+            .join(SocialAccount, SocialAccount.user_id == User.id)
+            .where(SocialAccount.social_name == self.name, SocialAccount.social_id == social_id)
+        ).scalar()
+
+    def _insert_social_account(self, social_id: str, email: str):
+        """ Email of the new linked user, None when the account is linked or the email taken """
+        new_user = insert(User.__table__).values(
+            id=uuid.uuid4(),
+            email=email,
+            password=make_unusable_password(),
+            active=True,
+            confirmed_at=datetime.date.today()
+        ).on_conflict_do_nothing(index_elements=['email']).returning(User.id).cte('new_user')
+
+        statement = insert(SocialAccount.__table__).from_select(
+            ['id', 'user_id', 'social_id', 'social_name'],
+            select(
+                # Untyped literals of a SELECT list are text to Postgres
+                cast(literal(str(uuid.uuid4())), UUID),
+                new_user.c.id,
+                literal(social_id),
+                literal(self.name)
+            )
+        ).on_conflict_do_nothing(constraint='social_pk').returning(SocialAccount.user_id).add_cte(new_user)
 
-    def _create_social_account(self, social_id, user_id):
-        social = SocialAccount(
-            social_id=social_id,
-            social_name=self.name,
-            user_id=user_id
-        )
-        db.session.add(social)
-        db.session.commit()
+        user_id = db.session.execute(statement).scalar()
+        return None if user_id is None else email
 
-    def _create_social_account_if_not_exists(self, social_id, email):
-        social = SocialAccount.query.filter(
-            and_(
-                SocialAccount.social_id == social_id,
-                SocialAccount.social_name == self.name
-            )
-        ).first()
+    def _exchange_code(self, data: dict) -> dict:
+        """ Token response for an authorization code, the request rauth used to make """
+        data = {
+            **data,
+            'client_id': self.credentials.client_id,
+            'client_secret': self.credentials.client_secret
+        }
+        return self.http.fetch_json('token', 'POST', self.credentials.access_token_url, data=data)
 
-        if not social:
-            user = self._create_user(email)
-            self._create_social_account(social_id, user.id)
-    
-    def _create_tokens(self, identity: str):
-        access_token = create_access_token(identity=identity)
-        refresh_token = create_refresh_token(identity=identity)
-        return jsonify(access_token=access_token, refresh_token=refresh_token)
+    def _log_failure(self, exc: Exception):
+        current_app.logger.warning('%s OAuth exchange failed: %r', self.name, exc)
 
     @abc.abstractmethod
     def authorize_user(self):
@@ -70,13 +143,7 @@ class BaseOAuth(abc.ABC):
 class YandexOAuth(BaseOAuth):
     name = 'yandex'
 
-    def __init__(self, credentials: dict):
-        self.service = OAuth2Service(**credentials.dict(exclude={'provider'}))
-
     def callback(self, request):
-        def decode_json(payload):
-            return json.loads(payload.decode('utf-8'))
-
         code = request.args.get('code')
         if not code:
             return None
@@ -85,23 +152,23 @@ class YandexOAuth(BaseOAuth):
             'code': code,
             'grant_type': 'authorization_code'
         }
-        session = self.service.get_auth_session(data=data, decoder=decode_json)
-        response = session.get('info').json()
-        return response
+        try:
+            token = self._exchange_code(data)
+            return self.http.fetch_json(
+                'userinfo', 'GET', urljoin(self.credentials.base_url, 'info'),
+                headers={'Authorization': f"Bearer {token['access_token']}"}
+            )
+        except (RequestException, ValueError, KeyError) as e:
+            self._log_failure(e)
+            return None
 
     def authorize_user(self, response):
-        social_id = response['id']
-        email = response['default_email']
-        self._create_social_account_if_not_exists(social_id, email)
-        return self._create_tokens(email)
+        return self._login(str(response['id']), response['default_email'])
 
 
 class VKOAuth(BaseOAuth):
     name = 'vk'
 
-    def __init__(self, credentials: dict):
-        self.service = OAuth2Service(**credentials.dict(exclude={'provider'}))
-
     def callback(self, request):
         code = request.args.get('code')
         if not code:
@@ -112,11 +179,12 @@ class VKOAuth(BaseOAuth):
             'grant_type': 'authorization_code',
             'redirect_uri': self.get_redirect_url(self.name)
         }
-        response = self.service.get_raw_access_token(data=data)
-        return response.json()
+        try:
+            return self._exchange_code(data)
+        except (RequestException, ValueError) as e:
+            self._log_failure(e)
+            return None
 
     def authorize_user(self, response):
-        social_id = response['user_id']
-        email = generate_random_email()
-        self._create_social_account_if_not_exists(social_id, email)
-        return self._create_tokens(email)
+        # VK shares no email, a placeholder one is made up on the first login only
+        return self._login(str(response['user_id']), generate_random_email())
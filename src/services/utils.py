@@ -1,8 +1,7 @@
 import string
+from functools import lru_cache
 from secrets import choice as secrets_choice
 
-from user_agents import parse
-
 
 def generate_random_string():
     alphabet = string.ascii_letters + string.digits
@@ -14,7 +13,39 @@ def generate_random_email():
     return f'{string}@auth.com'
 
 
+DEVICE_TYPE_CACHE_SIZE = 4096
+
+
 def get_device_type(user_agent: str):
+    # Same rules user_agents applies first in is_pc, without running ua-parser
+    if 'Windows NT' in user_agent:
+        return 'pc'
+    if 'Linux' in user_agent and 'X11' in user_agent and 'Maemo' not in user_agent:
+        return 'pc'
+    return _parse_device_type(user_agent)
+
+
+def get_device_type_cache_stats():
+    info = _parse_device_type.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': info.hits / lookups if lookups else 0.0
+    }
+
+
+def warm_up():
+    """ Import ua-parser now, e.g. in the gunicorn master before forking """
+    import user_agents  # noqa: F401
+
+
+@lru_cache(maxsize=DEVICE_TYPE_CACHE_SIZE)
+def _parse_device_type(user_agent: str):
+    # Compiling ua-parser's regexes takes ~0.3 s, only pay for it when needed
+    from user_agents import parse
     user_agent = parse(user_agent)
     if user_agent.is_pc:
         return 'pc'
@@ -1,7 +1,11 @@
+from contextlib import contextmanager
+
 import pytest
 from app import create_app
 from extensions.db import db
+from extensions.local_cache import user_cache
 from models import Base
+from sqlalchemy import event
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -29,4 +33,26 @@ def clear_table():
         else:
             table.query.delete()
             db.session.commit()
+        # Удалённые пользователи не должны оставаться в кеше воркера
+        user_cache.clear()
     return _clear_table
+
+
+@pytest.fixture()
+def query_budget(app):
+    """Падает, если код внутри блока выполнил больше SQL-запросов, чем разрешено."""
+    @contextmanager
+    def _query_budget(max_statements):
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+        assert len(statements) <= max_statements, \
+            f'{len(statements)} statements, budget {max_statements}:\n' + '\n'.join(statements)
+    return _query_budget
@@ -0,0 +1,40 @@
+import json
+from http import HTTPStatus
+
+from extensions.db import db
+from extensions.hashing import password_hasher
+from models import LoginHistory, Role, User
+
+
+def test_import_users(app, client, clear_table, tmp_path):
+    """Тестирование импорта пользователей из NDJSON с продолжением после сбоя."""
+    source = tmp_path / 'users.ndjson'
+    records = [
+        {'email': 'import1@example.com', 'password': 'password1', 'roles': ['importer']},
+        {'email': 'import2@example.com', 'password_hash': password_hasher.hash('password2')},
+        {'email': 'not-an-email', 'password': 'password3'},
+        {'email': 'import3@example.com', 'password_hash': 'md5$legacy'}
+    ]
+    source.write_text('\n'.join(json.dumps(record) for record in records))
+    # Первая запись уже импортирована прерванным запуском
+    (tmp_path / 'users.ndjson.state').write_text(json.dumps({'source': str(source), 'records': 1}))
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['users', 'import', str(source), '--chunk-size', '2', '--workers', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'Resuming after 1 records.' in result.output
+    assert User.query.filter(User.email == 'import1@example.com').first() is None
+    assert User.query.filter(User.email == 'import3@example.com').first() is None
+
+    result = runner.invoke(args=['users', 'import', str(source), '--restart', '--workers', '1'])
+    assert result.exit_code == 0, result.output
+    user = User.query.filter(User.email == 'import1@example.com').first()
+    assert [role.name for role in user.roles] == ['importer']
+    assert User.query.count() == 2
+
+    response = client.post('/v1/login', json={'email': 'import2@example.com', 'password': 'password2'})
+    assert response.status_code == HTTPStatus.OK
+
+    user.roles.clear()
+    db.session.commit()
+    clear_table([LoginHistory, User, Role])
@@ -0,0 +1,123 @@
+import datetime
+import uuid
+
+import pytest
+from commands.login_history import write_batch
+from extensions.cache import redis_db
+from extensions.db import db
+from models import (LoginHistory, User, add_months, create_month_partition,
+                    month_partition_name)
+from services.login_history_stream import login_history_stream
+from tests.utils import open_file
+
+
+@pytest.fixture()
+def test_stream(app, monkeypatch):
+    suffix = uuid.uuid4().hex
+    monkeypatch.setattr(login_history_stream, 'STREAM_KEY', f'login_history:test:{suffix}')
+    monkeypatch.setattr(login_history_stream, 'DEAD_LETTER_KEY', f'login_history:test:{suffix}:dead')
+    login_history_stream.create_group()
+    yield login_history_stream
+    redis_db.redis.delete(login_history_stream.STREAM_KEY, login_history_stream.DEAD_LETTER_KEY)
+
+
+def test_stream_lag(test_stream):
+    """Тестирование отставания группы: выданные без подтверждения и ещё не выданные события."""
+    for _ in range(3):
+        test_stream.push(uuid.uuid4(), 'pytest', 'other')
+    test_stream.read('pytest', 1, 1)
+
+    lag = test_stream.lag()
+    assert lag == {'pending': 1, 'undelivered': 2, 'stream_length': 3}
+
+
+def test_read_pending_in_batches(test_stream):
+    """Тестирование чтения всех неподтверждённых событий пачками после сбоя."""
+    for _ in range(5):
+        test_stream.push(uuid.uuid4(), 'pytest', 'other')
+    delivered = test_stream.read('pytest', 5, 1)
+
+    batches = list(test_stream.read_pending('pytest', 2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [event for batch in batches for event in batch] == delivered
+    assert test_stream.read('pytest', 1, 1) == []
+
+
+def test_write_batch_dead_letters_bad_event(client, clear_table, test_stream):
+    """Тестирование записи пачки, в которой событие удалённого пользователя нарушает внешний ключ."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    client.post('/v1/register', json=user_data)
+    user = User.query.filter(User.email == user_data['email']).first()
+
+    test_stream.push(user.id, 'pytest', 'other')
+    test_stream.push(uuid.uuid4(), 'pytest', 'other')
+    events = test_stream.read('pytest', 10, 1)
+
+    assert write_batch(events) == 1
+    assert LoginHistory.query.filter(LoginHistory.user_agent == 'pytest').count() == 1
+    dead = redis_db.redis.xrange(test_stream.DEAD_LETTER_KEY)
+    assert len(dead) == 1
+    assert dead[0][1][b'entry_id'] == events[1][0]
+    assert test_stream.lag()['pending'] == 0
+
+    clear_table([LoginHistory, User])
+
+
+def partition_of(record_id) -> str:
+    return db.session.execute(
+        'SELECT tableoid::regclass::text FROM login_history WHERE id = :id', {'id': record_id}
+    ).scalar()
+
+
+def test_partition_moves_default_rows(client, clear_table):
+    """Тестирование создания месячной секции, строки которой уже попали в секцию по умолчанию."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    client.post('/v1/register', json=user_data)
+    user = User.query.filter(User.email == user_data['email']).first()
+
+    month = add_months(datetime.date.today(), 24)
+    record = LoginHistory(
+        user_id=user.id,
+        user_agent='pytest',
+        user_device_type='other',
+        auth_datetime=datetime.datetime.combine(month, datetime.time(12))
+    )
+    db.session.add(record)
+    db.session.commit()
+    assert partition_of(record.id) == 'login_history_other_default'
+
+    name = month_partition_name('other', month)
+    with db.engine.begin() as connection:
+        assert create_month_partition(connection, 'other', month) == name
+    assert partition_of(record.id) == name
+
+    clear_table([LoginHistory, User])
+    with db.engine.begin() as connection:
+        connection.execute(f'DROP TABLE "{name}"')
+
+
+def test_partitions_retention(app, client, clear_table):
+    """Тестирование удаления секций старше срока хранения."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    client.post('/v1/register', json=user_data)
+    user = User.query.filter(User.email == user_data['email']).first()
+
+    month = add_months(datetime.date.today(), -24)
+    name = month_partition_name('other', month)
+    with db.engine.begin() as connection:
+        create_month_partition(connection, 'other', month)
+    db.session.add(LoginHistory(
+        user_id=user.id,
+        user_agent='pytest',
+        user_device_type='other',
+        auth_datetime=datetime.datetime.combine(month, datetime.time(12))
+    ))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['login-history', 'partitions', '--retention-months', '12'])
+    assert result.exit_code == 0, result.output
+    assert f'Dropped {name}' in result.output
+    assert db.session.execute(f"""SELECT to_regclass('"{name}"')""").scalar() is None
+    assert LoginHistory.query.filter(LoginHistory.user_agent == 'pytest').count() == 0
+
+    clear_table([LoginHistory, User])
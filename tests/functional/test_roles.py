@@ -0,0 +1,89 @@
+from http import HTTPStatus
+
+from tests.utils import open_file
+from extensions.db import db
+from extensions.local_cache import user_cache
+from models import LoginHistory, Role, User
+from services.role_service import role_service
+
+
+def login(client, user_data):
+    client.post('/v1/register', json=user_data)
+    response = client.post('/v1/login', json={
+        'email': user_data['email'],
+        'password': user_data['password']
+    })
+    return {'Authorization': f'Bearer {response.json["access_token"]}'}
+
+
+def test_roles_forbidden_without_admin_role(client, clear_table):
+    """Тестирование доступа к ролям пользователем без роли admin."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    headers = login(client, user_data)
+
+    response = client.get('/v1/roles', headers=headers)
+    assert response.status_code == HTTPStatus.FORBIDDEN
+
+    clear_table([LoginHistory, User])
+
+
+def test_roles_allowed_with_admin_role(client, clear_table):
+    """Тестирование доступа к ролям пользователем с ролью admin."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    headers = login(client, user_data)
+    user = User.query.filter(User.email == user_data['email']).first()
+    user.roles.append(Role(name='admin'))
+    db.session.commit()
+
+    response = client.get('/v1/roles', headers=headers)
+    assert response.status_code == HTTPStatus.OK
+    assert response.json == [{'name': 'admin', 'description': None}]
+
+    user.roles.clear()
+    db.session.commit()
+    clear_table([LoginHistory, User, Role])
+
+
+def test_role_check_is_single_query(client, clear_table, query_budget):
+    """Тестирование проверки роли пользователя одним запросом к базе."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    login(client, user_data)
+    user_cache.clear()
+
+    with query_budget(1):
+        assert not role_service.user_has_role(user_data['email'], 'admin', 'subscriber')
+
+    clear_table([LoginHistory, User])
+
+
+def test_bulk_role_assignment(client, clear_table, query_budget):
+    """Тестирование массового назначения и снятия роли."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    headers = login(client, user_data)
+    user = User.query.filter(User.email == user_data['email']).first()
+    user.roles.append(Role(name='admin'))
+    db.session.add(Role(name='subscriber'))
+    db.session.commit()
+    user_ids = [str(user.id), str(user.id), 'not-a-uuid']
+
+    # Проверка роли admin, поиск роли и один INSERT на чанк
+    with query_budget(3):
+        response = client.post('/v1/roles/subscriber/users', headers=headers, json={'users': user_ids})
+    assert response.status_code == HTTPStatus.OK
+    assert response.json['changed'] == 1
+    assert response.json['chunks'] == [{'received': 3, 'invalid': 1, 'changed': 1}]
+    assert role_service.user_has_role(user_data['email'], 'subscriber')
+
+    response = client.delete(
+        '/v1/roles/subscriber/users',
+        headers=headers,
+        data='\n'.join(f'"{user_id}"' for user_id in user_ids[:1]),
+        content_type='application/x-ndjson'
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.json['changed'] == 1
+    assert not role_service.user_has_role(user_data['email'], 'subscriber')
+
+    user.roles.clear()
+    db.session.commit()
+    clear_table([LoginHistory, User, Role])
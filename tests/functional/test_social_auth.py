@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+from config import OAuthProvider
+from extensions import oauth
+from extensions.cache import redis_db
+from flask_jwt_extended import decode_token
+from models import LoginHistory, SocialAccount, User
+from redis import RedisError
+from services.social_auth_service import SOCIAL_ACCOUNT_KEY
+
+
+class StubOAuthHandler(BaseHTTPRequestHandler):
+    """Токен и данные пользователя в форматах Яндекса и VK, соединения остаются открытыми."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        self.server.connections.add(self.client_address)
+        self.server.token_requests += 1
+        if form['code'] == ['slow']:
+            time.sleep(1)
+        if form['client_secret'] != ['secret']:
+            return self._reply({'error': 'invalid_client'}, HTTPStatus.UNAUTHORIZED)
+        self._reply({'access_token': 'stub-token', 'user_id': 'stub-7'})
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        if self.headers.get('Authorization') != 'Bearer stub-token':
+            return self._reply({'error': 'invalid_token'}, HTTPStatus.UNAUTHORIZED)
+        self._reply({'id': 'stub-42', 'default_email': 'social@example.com'})
+
+    def _reply(self, payload, status=HTTPStatus.OK):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stub_provider(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOAuthHandler)
+    server.daemon_threads = True
+    server.connections = set()
+    server.token_requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    url = f'http://127.0.0.1:{server.server_port}'
+    for provider, social_id in (('yandex', 'stub-42'), ('vk', 'stub-7')):
+        monkeypatch.setitem(oauth._credentials, provider, OAuthProvider(
+            provider=provider,
+            client_id='client',
+            client_secret='secret',
+            authorize_url=f'{url}/authorize',
+            access_token_url=f'{url}/token',
+            base_url=f'{url}/'
+        ))
+        monkeypatch.delitem(oauth._providers, provider, raising=False)
+        redis_db.redis.delete(SOCIAL_ACCOUNT_KEY.format(provider, social_id))
+    monkeypatch.setitem(oauth._http_options, 'read_timeout', 0.3)
+    yield server
+    oauth._providers.pop('yandex', None)
+    oauth._providers.pop('vk', None)
+    server.shutdown()
+    server.server_close()
+
+
+def test_oauth_callback_reuses_connection(client, clear_table, query_budget, stub_provider):
+    """Тестирование входа через провайдера по одному keep-alive соединению."""
+    response = client.get('/v1/oauth-callback/yandex?code=abc')
+    assert response.status_code == HTTPStatus.OK
+    assert 'access_token' in response.json
+
+    # Повторный вход обходится без Postgres
+    with query_budget(0):
+        response = client.get('/v1/oauth-callback/yandex?code=abc')
+    assert response.status_code == HTTPStatus.OK
+
+    assert len(stub_provider.connections) == 1
+    assert SocialAccount.query.filter(SocialAccount.social_id == 'stub-42').count() == 1
+    user = User.query.filter(User.email == 'social@example.com').first()
+    assert user.password.startswith('!')
+
+    response = client.post('/v1/login', json={'email': 'social@example.com', 'password': user.password})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    clear_table([LoginHistory, SocialAccount, User])
+
+
+def test_vk_repeat_login_keeps_identity(client, clear_table, stub_provider):
+    """Тестирование повторного входа через VK под тем же пользователем."""
+    identities = []
+    for _ in range(2):
+        response = client.get('/v1/oauth-callback/vk?code=abc')
+        assert response.status_code == HTTPStatus.OK
+        identities.append(decode_token(response.json['access_token'])['sub'])
+        redis_db.redis.delete(SOCIAL_ACCOUNT_KEY.format('vk', 'stub-7'))
+
+    assert identities[0] == identities[1]
+    assert User.query.filter(User.email == identities[0]).count() == 1
+
+    clear_table([LoginHistory, SocialAccount, User])
+
+
+def test_oauth_login_after_logout_all(client, clear_table, stub_provider):
+    """Тестирование входа через провайдера после выхода на всех устройствах и выхода парой токенов."""
+    response = client.get('/v1/oauth-callback/yandex?code=abc')
+    headers = {'Authorization': f'Bearer {response.json["access_token"]}'}
+    response = client.post('/v1/logout-all', headers=headers)
+    assert response.status_code == HTTPStatus.OK
+
+    response = client.get('/v1/oauth-callback/yandex?code=abc')
+    assert response.status_code == HTTPStatus.OK
+    tokens = response.json
+    headers = {'Authorization': f'Bearer {tokens["access_token"]}'}
+    response = client.get('/v1/check-auth', headers=headers)
+    assert response.status_code == HTTPStatus.OK
+
+    # Выход по access-токену отзывает и парный refresh-токен
+    response = client.post('/v1/logout', headers=headers)
+    assert response.status_code == HTTPStatus.OK
+    response = client.post('/v1/refresh', headers={'Authorization': f'Bearer {tokens["refresh_token"]}'})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    clear_table([LoginHistory, SocialAccount, User])
+
+
+def test_oauth_callback_email_taken(client, clear_table, stub_provider):
+    """Тестирование входа через провайдера с почтой пользователя, зарегистрированного паролем."""
+    response = client.post('/v1/register', json={
+        'email': 'social@example.com',
+        'password': 'a123456',
+        'confirm_password': 'a123456'
+    })
+    assert response.status_code == HTTPStatus.CREATED
+
+    response = client.get('/v1/oauth-callback/yandex?code=abc')
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert SocialAccount.query.count() == 0
+    assert redis_db.redis.get(SOCIAL_ACCOUNT_KEY.format('yandex', 'stub-42')) is None
+
+    clear_table([LoginHistory, User])
+
+
+def test_oauth_callback_without_redis(client, clear_table, stub_provider, monkeypatch):
+    """Тестирование входа через провайдера при недоступном Redis."""
+    def unavailable(*args, **kwargs):
+        raise RedisError('Connection refused')
+    monkeypatch.setattr(redis_db, 'get', unavailable)
+    monkeypatch.setattr(redis_db, 'set', unavailable)
+
+    identities = []
+    for _ in range(2):
+        response = client.get('/v1/oauth-callback/yandex?code=abc')
+        assert response.status_code == HTTPStatus.OK
+        identities.append(decode_token(response.json['access_token'])['sub'])
+
+    assert identities == ['social@example.com', 'social@example.com']
+    assert SocialAccount.query.count() == 1
+
+    clear_table([LoginHistory, SocialAccount, User])
+
+
+def test_oauth_callback_timeout(client, stub_provider):
+    """Тестирование таймаута ответа провайдера без повторной отправки кода."""
+    started = time.perf_counter()
+    response = client.get('/v1/oauth-callback/yandex?code=slow')
+    assert time.perf_counter() - started < 1
+    assert response.json == {'message': 'Code is not provided or another error occured.'}
+    assert stub_provider.token_requests == 1
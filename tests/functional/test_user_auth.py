@@ -1,7 +1,13 @@
 from http import HTTPStatus
 
+import datetime
+
 from tests.utils import open_file
+from extensions.cache import redis_db
+from extensions.db import db
+from flask_jwt_extended import create_access_token
 from models import LoginHistory, User
+from services.registered_emails import REGISTERED_EMAILS_KEY
 
 
 def test_user_register_with_wrong_data(client):
@@ -34,6 +40,23 @@ def test_existing_user_register(client, clear_table):
     clear_table(User)
 
 
+def test_register_precheck(app, client, clear_table, query_budget, monkeypatch):
+    """Тестирование регистрации одним запросом и отсечения дубликатов до хеширования пароля."""
+    monkeypatch.setitem(app.config, 'REGISTRATION_PRECHECK', True)
+    redis_db.redis.delete(REGISTERED_EMAILS_KEY)
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    with query_budget(1):
+        response = client.post('/v1/register', json=user_data)
+    assert response.status_code == HTTPStatus.CREATED
+
+    with query_budget(1) as statements:
+        response = client.post('/v1/register', json=user_data)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert statements[0].startswith('SELECT')
+
+    clear_table(User)
+
+
 def test_not_existing_user_login(client):
     """Тестирование авторизации несуществующего пользователя."""
     user_data = open_file('testdata/correct_register_data.json')[0]
@@ -92,6 +115,69 @@ def test_user_login_history(client, clear_table):
     clear_table([LoginHistory, User])
 
 
+def test_user_login_history_cursor(client, clear_table):
+    """Тестирование постраничного получения истории входов по курсору."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    client.post('/v1/register', json=user_data)
+    response = client.post('/v1/login', json={
+        'email': user_data['email'],
+        'password': user_data['password']
+    })
+    user = User.query.filter(User.email == user_data['email']).first()
+    db.session.add(LoginHistory(
+        user_id=user.id,
+        user_agent='pytest',
+        user_device_type='other',
+        auth_datetime=datetime.datetime(2020, 1, 1)
+    ))
+    db.session.commit()
+
+    headers = {'Authorization': f'Bearer {response.json["access_token"]}'}
+    response = client.get('v1/login-history?cursor=&per-page=1', headers=headers)
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json['items']) == 1
+    assert response.json['next_cursor']
+
+    response = client.get(
+        f'v1/login-history?cursor={response.json["next_cursor"]}&per-page=1',
+        headers=headers
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.json['items'][0]['user_agent'] == 'pytest'
+    assert response.json['next_cursor'] is None
+
+    response = client.get('v1/login-history?cursor=wrong', headers=headers)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    clear_table([LoginHistory, User])
+
+
+def test_login_history_wrong_per_page(client):
+    """Тестирование отказа в истории входов при недопустимом размере страницы."""
+    headers = {'Authorization': f'Bearer {create_access_token(identity="user@example.com")}'}
+    for params in ('per-page=0&cursor=', 'per-page=-1&cursor=', 'per-page=101&cursor='):
+        response = client.get(f'/v1/login-history?{params}', headers=headers)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_login_history_page_mode_per_page(client, clear_table):
+    """Тестирование прежнего поведения размера страницы без курсора."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    client.post('/v1/register', json=user_data)
+    response = client.post('/v1/login', json={
+        'email': user_data['email'],
+        'password': user_data['password']
+    })
+    headers = {'Authorization': f'Bearer {response.json["access_token"]}'}
+
+    for params, items in (('per-page=101', 1), ('per-page=-1', 1), ('per-page=0', 0)):
+        response = client.get(f'/v1/login-history?{params}', headers=headers)
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.json) == items
+
+    clear_table([LoginHistory, User])
+
+
 def test_refresh_token(client, clear_table):
     """Тестирование обновления токена."""
     user_data = open_file('testdata/correct_register_data.json')[0]
@@ -132,6 +218,49 @@ def test_revoke_token(client, clear_table):
     clear_table([LoginHistory, User])
 
 
+def test_revoke_token_pair(client, clear_table):
+    """Тестирование отзыва refresh-токена при выходе по access-токену."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    client.post('/v1/register', json=user_data)
+    response = client.post('/v1/login', json={
+        'email': user_data['email'],
+        'password': user_data['password']
+    })
+
+    access_token = response.json['access_token']
+    refresh_token = response.json['refresh_token']
+
+    client.post('/v1/logout', headers={'Authorization': f'Bearer {access_token}'})
+    response = client.post('/v1/refresh', headers={'Authorization': f'Bearer {refresh_token}'})
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    clear_table([LoginHistory, User])
+
+
+def test_logout_all(client, clear_table):
+    """Тестирование выхода из аккаунта на всех устройствах."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    client.post('/v1/register', json=user_data)
+    response = client.post('/v1/login', json={
+        'email': user_data['email'],
+        'password': user_data['password']
+    })
+
+    access_token = response.json['access_token']
+    refresh_token = response.json['refresh_token']
+
+    response = client.post('/v1/logout-all', headers={'Authorization': f'Bearer {access_token}'})
+    assert response.status_code == HTTPStatus.OK
+
+    response = client.get('/v1/check-auth', headers={'Authorization': f'Bearer {access_token}'})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    response = client.post('/v1/refresh', headers={'Authorization': f'Bearer {refresh_token}'})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    clear_table([LoginHistory, User])
+
+
 def test_wrong_change_password(client):
     """Тестирование смены пароля пользователем с неправпильно переданными данными."""
     data = open_file('testdata/wrong_change_user_password.json')
@@ -164,3 +293,44 @@ def test_correct_change_password(client):
     })
     
     assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_check_auth(client, clear_table, query_budget):
+    """Тестирование проверки авторизации пользователя."""
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    client.post('/v1/register', json=user_data)
+    response = client.post('/v1/login', json={
+        'email': user_data['email'],
+        'password': user_data['password']
+    })
+
+    access_token = response.json['access_token']
+    # Пользователь и его роли
+    with query_budget(2):
+        response = client.get('/v1/check-auth', headers={'Authorization': f'Bearer {access_token}'})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.get_json(force=True) == {'email': user_data['email'], 'roles': []}
+
+    clear_table([LoginHistory, User])
+
+
+def test_stateless_check_auth(app, client, clear_table, query_budget):
+    """Тестирование проверки авторизации по ролям из access токена."""
+    app.config['JWT_STATELESS_CHECK_AUTH'] = True
+    user_data = open_file('testdata/correct_register_data.json')[0]
+    client.post('/v1/register', json=user_data)
+    response = client.post('/v1/login', json={
+        'email': user_data['email'],
+        'password': user_data['password']
+    })
+    clear_table([LoginHistory, User])
+
+    access_token = response.json['access_token']
+    with query_budget(0):
+        response = client.get('/v1/check-auth', headers={'Authorization': f'Bearer {access_token}'})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.get_json(force=True) == {'email': user_data['email'], 'roles': []}
+
+    app.config['JWT_STATELESS_CHECK_AUTH'] = False
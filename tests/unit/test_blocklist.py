@@ -0,0 +1,121 @@
+import pytest
+from extensions import blocklist
+from extensions.blocklist import BloomFilter, TokenBlocklist
+
+
+class StreamEnd(Exception):
+    pass
+
+
+class FakeStreamRedis:
+    """Поток отозванных токенов в памяти с командами, которые читает TokenBlocklist.
+
+    Записи `incoming` появляются в потоке при первом XREAD, на следующем
+    XREAD без новых записей чтение прерывается.
+    """
+
+    def __init__(self, entries, incoming=()):
+        self.entries = []
+        self.incoming = list(incoming)
+        self.xrange_calls = 0
+        self._append(entries)
+
+    def _append(self, entries):
+        for fields in entries:
+            self.entries.append((f'{len(self.entries) + 1}-0'.encode(), fields))
+
+    def _after(self, entry_id: str):
+        after = 0 if entry_id == '-' else int(entry_id.lstrip('(').split('-')[0])
+        return [entry for entry in self.entries if int(entry[0].split(b'-')[0]) > after]
+
+    def xlen(self, key):
+        return len(self.entries)
+
+    def xrange(self, key, min='-', count=None):
+        self.xrange_calls += 1
+        return self._after(min)[:count]
+
+    def xread(self, streams, block=None):
+        self._append(self.incoming)
+        self.incoming = []
+        entries = self._after(list(streams.values())[0])
+        if not entries:
+            raise StreamEnd
+        return [(b'revoked_tokens', entries)]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """Тестирование отсутствия ложноотрицательных ответов фильтра."""
+    bloom = BloomFilter(1000, 0.01)
+    items = [f'jti-{i}' for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    assert bloom.count == 1000
+
+
+def test_bloom_filter_error_rate():
+    """Тестирование доли ложноположительных ответов в пределах заданной."""
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add(f'jti-{i}')
+
+    false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+    assert false_positives < 10000 * 0.02
+
+
+@pytest.fixture()
+def token_blocklist():
+    tokens = TokenBlocklist()
+    # Без фонового читателя, поток читают сами тесты
+    tokens.enabled = False
+    tokens.capacity = 10
+    return tokens
+
+
+def test_rebuild_applies_stream(monkeypatch, token_blocklist):
+    """Тестирование восстановления фильтра и поколений из потока."""
+    fake = FakeStreamRedis([
+        {b'jti': b'revoked-1'},
+        {b'identity': b'user@example.com', b'generation': b'2'},
+        {b'identity': b'user@example.com', b'generation': b'1'}
+    ])
+    monkeypatch.setattr(blocklist, 'redis_db', fake)
+
+    assert token_blocklist._rebuild() == '3-0'
+    assert token_blocklist._synced
+    assert 'revoked-1' in token_blocklist._filter
+    assert token_blocklist._generations == {'user@example.com': 2}
+    assert token_blocklist.is_revoked('any', 'user@example.com', 1)
+
+
+def test_rebuild_sizes_filter_from_stream(monkeypatch, token_blocklist):
+    """Тестирование размера фильтра по длине потока сверх настроенной ёмкости."""
+    fake = FakeStreamRedis([{b'jti': f'revoked-{i}'.encode()} for i in range(50)])
+    monkeypatch.setattr(blocklist, 'redis_db', fake)
+
+    token_blocklist._rebuild()
+    assert token_blocklist._synced
+    assert token_blocklist._filter.capacity == 100
+
+
+def test_overfull_filter_keeps_consuming(monkeypatch, token_blocklist):
+    """Тестирование работы без перестроения по кругу после переполнения фильтра."""
+    fake = FakeStreamRedis(
+        [{b'jti': b'revoked-0'}],
+        incoming=[{b'jti': f'revoked-{i}'.encode()} for i in range(1, 31)]
+    )
+    monkeypatch.setattr(blocklist, 'redis_db', fake)
+
+    def stop(seconds):
+        raise SystemExit
+    monkeypatch.setattr(blocklist.time, 'sleep', stop)
+
+    with pytest.raises(SystemExit):
+        token_blocklist._read_stream()
+
+    # Одно перестроение (два XRANGE), дальше только чтение новых записей
+    assert fake.xrange_calls == 2
+    assert token_blocklist._filter.count == 31
+    assert not token_blocklist._synced
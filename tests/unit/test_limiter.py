@@ -0,0 +1,85 @@
+from http import HTTPStatus
+
+import pytest
+from extensions import limiter
+from extensions.limiter import (LocalTokenBucket, client_address,
+                                rate_limit_key)
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+
+@pytest.fixture()
+def limiter_app():
+    app = Flask(__name__)
+    app.config.update(
+        JWT_SECRET_KEY='secret',
+        RATELIMIT_REAL_IP_HEADER='X-Real-IP',
+        RATELIMIT_TRUSTED_PROXIES='127.0.0.1, 172.16.0.0/12'
+    )
+    JWTManager(app)
+    return app
+
+
+@pytest.mark.parametrize('remote_addr, headers, address', [
+    ('172.18.0.5', {'X-Real-IP': '203.0.113.7'}, '203.0.113.7'),
+    ('127.0.0.1', {'X-Real-IP': '203.0.113.7'}, '203.0.113.7'),
+    ('172.18.0.5', {}, '172.18.0.5'),
+    ('198.51.100.2', {'X-Real-IP': '203.0.113.7'}, '198.51.100.2'),
+    ('::1', {'X-Real-IP': '203.0.113.7'}, '::1')
+])
+def test_client_address(limiter_app, remote_addr, headers, address):
+    """Тестирование адреса клиента: заголовок X-Real-IP принимается только от доверенных прокси."""
+    with limiter_app.test_request_context(environ_base={'REMOTE_ADDR': remote_addr}, headers=headers):
+        assert client_address() == address
+
+
+def test_rate_limit_key(limiter_app):
+    """Тестирование ключа лимита: пользователь из токена, иначе адрес клиента."""
+    with limiter_app.app_context():
+        token = create_access_token(identity='user@example.com')
+
+    environ = {'REMOTE_ADDR': '198.51.100.2'}
+    with limiter_app.test_request_context(environ_base=environ, headers={'Authorization': f'Bearer {token}'}):
+        assert rate_limit_key() == 'user:user@example.com'
+    with limiter_app.test_request_context(environ_base=environ, headers={'Authorization': 'Bearer broken'}):
+        assert rate_limit_key() == 'ip:198.51.100.2'
+    with limiter_app.test_request_context(environ_base=environ, headers={'X-Real-IP': '203.0.113.7'}):
+        assert rate_limit_key() == 'ip:198.51.100.2'
+
+
+def test_token_bucket_refills(monkeypatch):
+    """Тестирование ведра токенов: запас на всплеск и пополнение со временем."""
+    now = [100.0]
+    monkeypatch.setattr(limiter.time, 'monotonic', lambda: now[0])
+    bucket = LocalTokenBucket(rate=2, burst=3)
+
+    assert [bucket.allow('ip:1') for _ in range(4)] == [True, True, True, False]
+    assert bucket.allow('ip:2')
+    now[0] += 0.5
+    assert bucket.allow('ip:1')
+    assert not bucket.allow('ip:1')
+    assert bucket.rejected == 2
+
+
+def test_token_bucket_forgets_oldest_keys():
+    """Тестирование ограничения числа ключей: забытый ключ начинает с полным ведром."""
+    bucket = LocalTokenBucket(rate=0.001, burst=1, max_keys=2)
+    assert bucket.allow('ip:1')
+    assert not bucket.allow('ip:1')
+    bucket.allow('ip:2')
+    bucket.allow('ip:3')
+
+    assert len(bucket._buckets) == 2
+    assert bucket.allow('ip:1')
+
+
+def test_token_bucket_rejects_request(limiter_app):
+    """Тестирование ответа 429 с Retry-After при исчерпанном ведре."""
+    bucket = LocalTokenBucket(rate=0.5, burst=1)
+    with limiter_app.test_request_context(environ_base={'REMOTE_ADDR': '198.51.100.2'}):
+        assert bucket.check_request() is None
+        body, status, headers = bucket.check_request()
+
+    assert status == HTTPStatus.TOO_MANY_REQUESTS
+    assert body == {'message': 'Too many requests.'}
+    assert headers == {'Retry-After': '2'}
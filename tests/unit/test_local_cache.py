@@ -0,0 +1,50 @@
+from extensions import local_cache
+from extensions.local_cache import InvalidatedCache
+from redis import RedisError
+
+
+class FakePubSub:
+    def subscribe(self, **handlers):
+        self.handlers = handlers
+
+    def run_in_thread(self, **kwargs):
+        return None
+
+
+class FakeRedis:
+    def __init__(self):
+        self.published = []
+        self.available = True
+
+    def pubsub(self, **kwargs):
+        return FakePubSub()
+
+    def publish(self, channel, message):
+        if not self.available:
+            raise RedisError('Connection refused')
+        self.published.append((channel, message))
+
+
+def test_invalidate_publishes(monkeypatch):
+    """Тестирование сброса записи в своём воркере и рассылки другим."""
+    fake = FakeRedis()
+    monkeypatch.setattr(local_cache, 'redis_db', fake)
+    cache = InvalidatedCache('test-cache')
+    cache.set('user@example.com', 'cached')
+    assert cache.get('user@example.com') == 'cached'
+
+    cache.invalidate('user@example.com')
+    assert cache.get('user@example.com') is None
+    assert fake.published == [('test-cache', 'user@example.com')]
+
+
+def test_invalidate_without_redis(monkeypatch):
+    """Тестирование сброса записи при недоступном Redis."""
+    fake = FakeRedis()
+    monkeypatch.setattr(local_cache, 'redis_db', fake)
+    cache = InvalidatedCache('test-cache')
+    cache.set('user@example.com', 'cached')
+
+    fake.available = False
+    cache.invalidate('user@example.com')
+    assert cache.get('user@example.com') is None
@@ -0,0 +1,52 @@
+import datetime
+import uuid
+
+from redis import DataError
+from services import login_history_stream as stream_module
+from services.login_history_stream import LoginHistoryStream
+
+
+class FakePendingRedis:
+    """Неподтверждённые записи группы, как их отдаёт XREADGROUP с id вместо '>'."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.acked = []
+
+    def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        if count is not None and count < 1:
+            raise DataError('XREADGROUP count must be a positive integer')
+        after = list(streams.values())[0]
+        entries = [
+            entry for entry in self.entries
+            if after == '0' or int(entry[0].split(b'-')[0]) > int(after.split(b'-')[0])
+        ][:count]
+        return [(b'login_history', entries)] if entries else []
+
+    def xack(self, key, group, *entry_ids):
+        self.acked.extend(entry_ids)
+
+
+def event_fields():
+    return {
+        b'id': str(uuid.uuid4()).encode(),
+        b'user_id': str(uuid.uuid4()).encode(),
+        b'user_agent': b'pytest',
+        b'user_device_type': b'other',
+        b'auth_datetime': datetime.datetime.now().isoformat().encode()
+    }
+
+
+def test_read_pending_in_batches(monkeypatch):
+    """Тестирование чтения всех неподтверждённых событий пачками, включая удалённые из потока."""
+    entries = [(f'{i}-0'.encode(), event_fields()) for i in range(1, 6)]
+    # Запись, вытесненная из потока по maxlen, приходит без полей
+    entries[2] = (b'3-0', {})
+    fake = FakePendingRedis(entries)
+    monkeypatch.setattr(stream_module, 'redis_db', fake)
+
+    batches = list(LoginHistoryStream().read_pending('pytest', 2))
+    assert [[entry_id for entry_id, _ in batch] for batch in batches] == [
+        [b'1-0', b'2-0'], [b'4-0'], [b'5-0']
+    ]
+    assert fake.acked == [b'3-0']
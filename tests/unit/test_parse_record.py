@@ -0,0 +1,35 @@
+import pytest
+from commands.import_users import parse_record
+from extensions.hashing import password_hasher
+
+
+def test_parse_record():
+    """Тестирование разбора записи импорта: роли строкой или списком."""
+    record = {'email': ' user@example.com ', 'password': 'password', 'roles': 'admin; viewer;'}
+    assert parse_record(record) == ('user@example.com', 'password', None, {'admin', 'viewer'})
+
+    password_hash = password_hasher.hash('password')
+    record = {'email': 'user@example.com', 'password_hash': password_hash, 'roles': ['admin', None, ' ']}
+    assert parse_record(record) == ('user@example.com', None, password_hash, {'admin'})
+
+
+@pytest.mark.parametrize('record, error', [
+    ('Expecting value: line 1 column 1 (char 0)', 'Expecting value'),
+    ([], 'Expected an object.'),
+    ({'email': ['user@example.com'], 'password': 'password'}, 'Expected email to be a string.'),
+    ({'email': f'{"u" * 250}@example.com', 'password': 'password'}, 'Email is longer than 255 characters.'),
+    ({'email': 'not-an-email', 'password': 'password'}, "Invalid email: 'not-an-email'"),
+    ({'email': 'user@example.com'}, 'Expected either password or password_hash.'),
+    ({'email': 'user@example.com', 'password': 12345678}, 'Expected password or password_hash to be a string.'),
+    ({'email': 'user@example.com', 'password_hash': 'md5$legacy'}, 'Unsupported password hash.'),
+    ({'email': 'user@example.com', 'password': 'password', 'roles': {'admin': True}},
+     'Expected roles to be a list of strings.'),
+    ({'email': 'user@example.com', 'password': 'password', 'roles': ['admin', 7]},
+     'Expected roles to be a list of strings.'),
+    ({'email': 'user@example.com', 'password': 'password', 'roles': ['r' * 81]},
+     'Role name is longer than 80 characters.')
+])
+def test_parse_record_rejects(record, error):
+    """Тестирование отклонения записей, которые нельзя импортировать."""
+    with pytest.raises(ValueError, match=error):
+        parse_record(record)
@@ -0,0 +1,93 @@
+import datetime
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from extensions import json_provider as json_provider_module
+from extensions.json_provider import json_provider, json_response
+from flask import Flask, jsonify
+from schemas import login_history_schema, role_schema, user_roles
+from serializers import dump_login_history, dump_roles, dump_user_roles
+from services.auth_service import CachedUser
+
+MSK = datetime.timezone(datetime.timedelta(hours=3))
+
+
+@pytest.fixture()
+def json_app(monkeypatch):
+    monkeypatch.setattr(json_provider, 'enabled', json_provider.enabled)
+    monkeypatch.setattr(json_provider, 'options', json_provider.options)
+    app = Flask(__name__)
+    app.config['JSON_PROVIDER'] = 'orjson'
+    json_provider.init_app(app)
+    with app.test_request_context():
+        yield app
+
+
+@pytest.fixture()
+def orjson_only(monkeypatch):
+    def fallback(obj):
+        raise AssertionError('Answered by jsonify instead of orjson')
+    monkeypatch.setattr(json_provider_module, 'jsonify', fallback)
+
+
+@pytest.fixture()
+def login_history_rows():
+    return [
+        SimpleNamespace(
+            user_id=uuid.UUID('5ce0e9a5-6015-4fec-aadf-a328ae398115'),
+            user_agent='Mozilla/5.0 "quoted" back\\slash\ttab </script> & <b>',
+            auth_datetime=datetime.datetime(2022, 6, 1, 12, 30, 5, 123456)
+        ),
+        SimpleNamespace(
+            user_id=uuid.uuid4(),
+            user_agent=None,
+            auth_datetime=datetime.datetime(2022, 6, 1, 12, 30, tzinfo=MSK)
+        ),
+        SimpleNamespace(
+            user_id=uuid.uuid4(),
+            user_agent='Мобильный браузер',
+            auth_datetime=datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+        )
+    ]
+
+
+@pytest.fixture()
+def roles():
+    return [
+        SimpleNamespace(name='admin', description='Full "access" \\ <all>'),
+        SimpleNamespace(name='viewer', description=None),
+        SimpleNamespace(name='редактор', description='Правка')
+    ]
+
+
+def test_login_history_matches_jsonify(json_app, login_history_rows, orjson_only):
+    """Тестирование побайтового совпадения истории входов, собранной orjson, с выводом jsonify."""
+    rows = login_history_rows[:2]
+    expected = jsonify(login_history_schema.dump(rows, many=True))
+    response = json_response(dump_login_history(rows))
+    assert response.get_data() == expected.get_data()
+    assert response.mimetype == expected.mimetype
+
+
+def test_non_ascii_login_history_matches_jsonify(json_app, login_history_rows):
+    """Тестирование истории входов с не-ASCII строкой, которую экранирует jsonify."""
+    expected = jsonify(login_history_schema.dump(login_history_rows, many=True))
+    assert json_response(dump_login_history(login_history_rows)).get_data() == expected.get_data()
+
+
+def test_roles_match_jsonify(json_app, roles, orjson_only):
+    """Тестирование побайтового совпадения списка ролей с выводом jsonify."""
+    assert dump_roles(roles) == role_schema.dump(roles, many=True)
+    expected = jsonify(role_schema.dump(roles[:2], many=True))
+    assert json_response(dump_roles(roles[:2])).get_data() == expected.get_data()
+
+
+def test_user_roles_match_schema_dumps(roles):
+    """Тестирование совпадения ответа check-auth с user_roles.dumps."""
+    user = CachedUser(id=uuid.uuid4(), email='user@example.com', roles=tuple(dump_roles(roles)))
+    assert json.dumps(dump_user_roles(user)) == user_roles.dumps(user)
+
+    token_claims = {'email': 'user@example.com', 'roles': role_schema.dump(roles, many=True)}
+    assert json.dumps(dump_user_roles(token_claims)) == user_roles.dumps(token_claims)
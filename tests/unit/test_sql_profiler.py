@@ -0,0 +1,33 @@
+import pytest
+from extensions.sql_profiler import sql_profiler
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+
+@pytest.fixture()
+def profiler(monkeypatch):
+    monkeypatch.setattr(sql_profiler, 'slow_query_seconds', sql_profiler.slow_query_seconds)
+    app = Flask(__name__)
+    app.config.update(SQL_SLOW_QUERY_MS=1000, SQL_PROFILER_HEADERS=True)
+    sql_profiler.init_app(app)
+    with app.test_request_context():
+        yield sql_profiler
+
+
+def test_failed_statement_is_not_counted(profiler):
+    """Тестирование подсчёта запросов после запроса, завершившегося ошибкой."""
+    engine = create_engine('sqlite://')
+    with engine.connect() as connection:
+        # Без запросов диалекта при первом подключении
+        profiler._reset()
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql('SELECT * FROM missing')
+        assert connection.exec_driver_sql('SELECT 1').scalar() == 1
+        assert connection.exec_driver_sql('SELECT 2').scalar() == 2
+        # Упавший запрос не оставляет время начала в соединении из пула
+        assert not connection.info.get('query_started')
+
+    stats = profiler.current()
+    assert stats.statements == 2
+    assert 0 < stats.time < 1
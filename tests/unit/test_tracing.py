@@ -0,0 +1,77 @@
+import pytest
+from extensions.jaeger import (RouteRatioSampler, create_tracer_provider,
+                               exporter_names)
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import \
+    InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import Decision
+from opentelemetry.trace import Status, StatusCode
+
+TRACE_ID = 0x5ce0e9a56015fec5aadfa328ae398115
+
+
+@pytest.fixture()
+def tracing_config():
+    return {
+        'TRACING_SAMPLE_RATIO': 0,
+        'TRACING_ROUTE_SAMPLE_RATIOS': {'/v1/roles': 1},
+        'TRACING_TAIL_CAPTURE': True,
+        'TRACING_SLOW_REQUEST_MS': 500,
+        'TRACING_MAX_QUEUE_SIZE': 2048,
+        'TRACING_SCHEDULE_DELAY_MS': 5000,
+        'TRACING_MAX_EXPORT_BATCH_SIZE': 512,
+        'TRACING_EXPORT_TIMEOUT_MS': 30000
+    }
+
+
+@pytest.mark.parametrize('value, names', [
+    ('jaeger', ['jaeger']),
+    ('jaeger, console', ['jaeger', 'console']),
+    ('none', []),
+    ('None', []),
+    ('', [])
+])
+def test_exporter_names(value, names):
+    """Тестирование списка экспортёров, 'none' и пустое значение отключают экспорт."""
+    assert exporter_names(value) == names
+
+
+def test_route_ratio_sampler():
+    """Тестирование доли выборки отдельно для каждого маршрута."""
+    sampler = RouteRatioSampler(1, {'/v1/check-auth': 0})
+    assert sampler.should_sample(None, TRACE_ID, '/v1/login').decision == Decision.RECORD_AND_SAMPLE
+    assert sampler.should_sample(None, TRACE_ID, '/v1/check-auth').decision == Decision.DROP
+
+    sampler = RouteRatioSampler(1, {'/v1/check-auth': 0}, record_unsampled=True)
+    assert sampler.should_sample(None, TRACE_ID, '/v1/check-auth').decision == Decision.RECORD_ONLY
+
+
+def test_tracer_provider_without_exporters(tracing_config):
+    """Тестирование провайдера без экспортёров: невыбранные спаны не записываются."""
+    tracer = create_tracer_provider(tracing_config, []).get_tracer(__name__)
+    with tracer.start_as_current_span('/v1/login') as span:
+        assert not span.is_recording()
+    with tracer.start_as_current_span('/v1/roles') as span:
+        assert span.get_span_context().trace_flags.sampled
+
+
+def test_tracer_provider_exports_failed_spans(tracing_config):
+    """Тестирование экспорта невыбранных спанов, завершившихся ошибкой."""
+    exporter = InMemorySpanExporter()
+    provider = create_tracer_provider(tracing_config, [exporter])
+    tracer = provider.get_tracer(__name__)
+
+    with tracer.start_as_current_span('/v1/login'):
+        pass
+    with tracer.start_as_current_span('/v1/login') as span:
+        span.set_status(Status(StatusCode.ERROR))
+    with tracer.start_as_current_span('/v1/roles'):
+        pass
+    provider.force_flush()
+
+    spans = exporter.get_finished_spans()
+    assert [(span.name, span.status.status_code) for span in spans] == [
+        ('/v1/login', StatusCode.ERROR),
+        ('/v1/roles', StatusCode.UNSET)
+    ]
+    assert all(span.context.trace_flags.sampled for span in spans)
+    provider.shutdown()